@@ -0,0 +1,277 @@
+import argparse, asyncio, os, statistics, time
+
+import stubs
+
+# Benchmarks contra servidores locales (stubs.py), sin red ni credenciales.
+#   python bench.py difusion --instancias 4 --cuentas 5 --toots 5
+#   python bench.py masivo --titulos 200 --lote 10 --concurrencia 8
+#   python bench.py ciclo --titulos 1000,100000,1000000 --ciclos 20
+#   python bench.py ingesta --lineas 1000000
+#   python bench.py arranque --presupuesto 0.3
+#   python bench.py selector --titulos 10000,100000,1000000 --elecciones 100000
+
+
+def _percentil(valores, p):
+  valores = sorted(valores)
+  return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def benchDifusion(args):
+  from cuentas import Flota
+
+  servidores = [stubs.mastodonFalso(args.latencia) for _ in range(args.instancias)]
+  cuentas = [{"nombre": f"bot{i}-{j}", "instancia": servidor.url, "token": "x"}
+             for i, servidor in enumerate(servidores) for j in range(args.cuentas)]
+  flota = Flota(cuentas, concurrencia=args.concurrencia)
+
+  async def difundir():
+    latencias = []
+    inicio = time.perf_counter()
+    for n in range(args.toots):
+      t = time.perf_counter()
+      toots = await flota.publicar(f"Resumen {n}")
+      await flota.responder(f"Libro {n}", toots)
+      latencias.append(time.perf_counter() - t)
+    return time.perf_counter() - inicio, latencias
+
+  total, latencias = asyncio.run(difundir())
+  flota.cerrar()
+  peticiones = sum(len(servidor.peticiones) for servidor in servidores)
+  for servidor in servidores:
+    servidor.parar()
+  print(f"{len(cuentas)} cuentas en {args.instancias} instancias, {args.toots} ciclos")
+  print(f"  {peticiones} peticiones en {total:.2f} s ({peticiones / total:.0f} peticiones/s)")
+  print(f"  latencia por ciclo: media {statistics.mean(latencias) * 1000:.1f} ms, "
+        f"p95 {_percentil(latencias, 0.95) * 1000:.1f} ms")
+
+
+def benchMasivo(args):
+  import tempfile
+  import openai
+  from catalogo import Catalogo
+  from masivo import ResumenMasivo
+  from resumenes import CacheResumenes, Resumidor
+
+  servidor = stubs.openaiFalso(args.latencia)
+  openai.api_base = servidor.url + "/v1"
+  openai.api_key = "falsa"
+  libros = [f"Libro {n} - Autor {n % 97}" for n in range(args.titulos)]
+
+  def medir(lote, concurrencia):
+    with tempfile.TemporaryDirectory() as carpeta:
+      catalogo = Catalogo(os.path.join(carpeta, "catalogo.db"))
+      catalogo.agregar(libros)
+      resumidor = Resumidor(CacheResumenes(os.path.join(carpeta, "resumenes.db")))
+      masivo = ResumenMasivo(resumidor, os.path.join(carpeta, "resumenes.jsonl"),
+                             lote, concurrencia, args.rpm, args.tpm)
+      inicio = time.perf_counter()
+      hechos = asyncio.run(masivo.ejecutar(catalogo.recorrer()))
+      total = time.perf_counter() - inicio
+    print(f"  lote {lote:3d}, concurrencia {concurrencia:3d}: {hechos} titulos en "
+          f"{total:.2f} s ({hechos / total:.1f} titulos/s)")
+
+  print(f"{args.titulos} titulos, {args.latencia * 1000:.0f} ms por peticion")
+  medir(1, 1)
+  medir(args.lote, args.concurrencia)
+  servidor.parar()
+
+
+def benchCiclo(args):
+  import contextlib, io, json, tempfile
+  import openai
+  import main, metricas
+  from catalogo import Catalogo
+
+  # Ciclo completo (eleccion, resumen, toot y respuesta) contra OpenAI y
+  # Mastodon falsos, con catalogos sinteticos de distintos tamaños.
+  servidorOpenAI = stubs.openaiFalso(args.latencia)
+  servidorMastodon = stubs.mastodonFalso(args.latencia)
+  openai.api_base = servidorOpenAI.url + "/v1"
+  openai.api_key = "falsa"
+  main.retraso_respuesta = 0
+  origen = os.getcwd()
+  for tamaño in (int(t) for t in args.titulos.split(",")):
+    with tempfile.TemporaryDirectory() as carpeta:
+      os.chdir(carpeta)
+      try:
+        with open("cuentas.json", "w") as f:
+          json.dump({"cuentas": [{"nombre": f"bot{n}", "instancia": servidorMastodon.url,
+                                  "token": "x"} for n in range(args.cuentas)]}, f)
+        inicio = time.perf_counter()
+        Catalogo("catalogo.db").agregar(
+          f"Libro {n} - Autor {n % 1000}" for n in range(tamaño))
+        carga = time.perf_counter() - inicio
+        main._catalogo = main._resumidor = main._pregenerador = None
+        main._flota = main._planificador = main._bitacora = main._eleccion = None
+        metricas.reiniciar()
+
+        async def ciclos():
+          for _ in range(args.ciclos):
+            await main.publicarToot()
+          await main.getPlanificador().ejecutar()
+
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+          asyncio.run(ciclos())
+        total = time.perf_counter() - inicio
+        main.getFlota().cerrar()
+      finally:
+        os.chdir(origen)
+    print(f"{tamaño} titulos: carga {carga:.2f} s, {args.ciclos} ciclos en {total:.2f} s "
+          f"({args.ciclos / total:.1f} ciclos/s)")
+    for nombre, (cuenta, suma, bytes_) in sorted(metricas.resumen().items()):
+      print(f"  {nombre:10s} {cuenta:6d} llamadas  media {suma / cuenta * 1000:8.2f} ms  "
+            f"{bytes_:9d} bytes")
+  servidorOpenAI.parar()
+  servidorMastodon.parar()
+
+
+def benchIngesta(args):
+  import random, tempfile
+  from catalogo import Catalogo
+
+  # Lista en bruto sintetica con numeracion, mojibake, duplicados exactos y
+  # variantes de autor, importada en streaming a un catalogo vacio.
+  azar = random.Random(1)
+  nombres = ["Fedor Dostoiewski", "Emily Brontë", "José Martí", "Stephen King",
+             "Gabriel García Márquez", "Arthur C. Clarke"]
+
+  def lineas():
+    for n in range(args.lineas):
+      libro = azar.randrange(int(args.lineas * 0.9))
+      titulo = f"El libro número {libro}"
+      autor = f"{nombres[libro % len(nombres)]} {libro % args.autores}"
+      if azar.random() < 0.2:
+        autor = autor.encode("utf-8").decode("cp1252", "replace")
+      if azar.random() < 0.1:
+        autor = autor.replace("ie", "ies", 1)
+      yield f"{n + 1}. {titulo} - {autor}\n"
+
+  with tempfile.TemporaryDirectory() as carpeta:
+    catalogo = Catalogo(os.path.join(carpeta, "catalogo.db"))
+    inicio = time.perf_counter()
+    nuevos = catalogo.agregar(lineas())
+    total = time.perf_counter() - inicio
+  print(f"{args.lineas} lineas en {total:.2f} s ({args.lineas / total:.0f} lineas/s), "
+        f"{nuevos} libros distintos")
+
+
+def benchSelector(args):
+  import random, tempfile
+  from catalogo import Catalogo
+  from selector import Selector
+
+  # Elecciones por segundo con catalogos sinteticos: una quinta parte de los
+  # libros es de 20 autores muy prolificos, uno de cada diez es de una serie
+  # numerada y algunos autores tienen peso. Primero el selector solo y
+  # despues Catalogo.elegir con y sin selector.
+  azar = random.Random(1)
+  for tamaño in (int(t) for t in args.titulos.split(",")):
+    autores = max(20, tamaño // 20)
+    libros = [(n + 1, f"Saga {n // 7} {n % 7 + 1}" if n % 10 == 0 else f"Libro {n}",
+               f"Autor {azar.randrange(20) if azar.random() < 0.2 else azar.randrange(autores)}")
+              for n in range(tamaño)]
+    pesos = {f"Autor {n}": 0.5 + n % 4 for n in range(0, autores, 10)}
+    inicio = time.perf_counter()
+    selector = Selector(ventana=args.ventana, pesos=pesos, azar=random.Random(1))
+    for id, titulo, autor in libros:
+      selector.agregar(id, f"{titulo} - {autor}", autor)
+    carga = time.perf_counter() - inicio
+    # Solo la primera mitad: al final quedan pocos autores y las
+    # restricciones se relajan recorriendo la lista.
+    elecciones = min(args.elecciones, tamaño // 2)
+    inicio = time.perf_counter()
+    for _ in range(elecciones):
+      selector.elegir()
+    total = time.perf_counter() - inicio
+    print(f"{tamaño} titulos, {autores} autores: carga {carga:.2f} s, "
+          f"{elecciones / total:.0f} elecciones/s ({total / elecciones * 1e6:.1f} us)")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+      Catalogo(os.path.join(carpeta, "catalogo.db")).agregar(
+        f"{titulo} - {autor}" for _, titulo, autor in libros)
+      for nombre, selector in (("sqlite", None), ("selector", Selector(ventana=args.ventana))):
+        catalogo = Catalogo(os.path.join(carpeta, "catalogo.db"), selector)
+        catalogo.libres()
+        inicio = time.perf_counter()
+        catalogo.elegir()
+        primera = time.perf_counter() - inicio
+        cuantas = min(1000, tamaño // 3)
+        inicio = time.perf_counter()
+        for _ in range(cuantas):
+          catalogo.elegir()
+        total = time.perf_counter() - inicio
+        print(f"  Catalogo.elegir {nombre:8s} primera {primera * 1000:8.1f} ms, "
+              f"{cuantas / total:.0f} elecciones/s")
+
+
+def benchArranque(args):
+  import subprocess, sys
+
+  # Arranque en frio: un proceso nuevo que importa main y muestra la ayuda,
+  # sin credenciales en el entorno. Falla si la mediana pasa del presupuesto.
+  entorno = {k: v for k, v in os.environ.items()
+             if k not in ("token_mast", "openAiSecret", "org_id")}
+  tiempos = []
+  for _ in range(args.repeticiones):
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"], check=True, env=entorno,
+                   stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    tiempos.append(time.perf_counter() - inicio)
+  mediana = statistics.median(tiempos)
+  print(f"arranque: mediana {mediana * 1000:.0f} ms, minimo {min(tiempos) * 1000:.0f} ms "
+        f"(presupuesto {args.presupuesto * 1000:.0f} ms)")
+  if mediana > args.presupuesto:
+    sys.exit(1)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks del bot")
+  sub = parser.add_subparsers(dest="bench", required=True)
+
+  p = sub.add_parser("difusion", help="publicar en muchas cuentas contra un Mastodon falso")
+  p.add_argument("--instancias", type=int, default=4)
+  p.add_argument("--cuentas", type=int, default=5, help="cuentas por instancia")
+  p.add_argument("--toots", type=int, default=5)
+  p.add_argument("--concurrencia", type=int, default=4)
+  p.add_argument("--latencia", type=float, default=0.02, help="segundos por peticion")
+  p.set_defaults(funcion=benchDifusion)
+
+  p = sub.add_parser("masivo", help="resumen masivo contra una API de OpenAI falsa")
+  p.add_argument("--titulos", type=int, default=200)
+  p.add_argument("--lote", type=int, default=10)
+  p.add_argument("--concurrencia", type=int, default=8)
+  p.add_argument("--rpm", type=int, default=100000)
+  p.add_argument("--tpm", type=int, default=10000000)
+  p.add_argument("--latencia", type=float, default=0.1, help="segundos por peticion")
+  p.set_defaults(funcion=benchMasivo)
+
+  p = sub.add_parser("ciclo", help="ciclo completo con catalogos sinteticos")
+  p.add_argument("--titulos", default="1000,100000,1000000", help="tamaños separados por comas")
+  p.add_argument("--ciclos", type=int, default=20)
+  p.add_argument("--cuentas", type=int, default=2)
+  p.add_argument("--latencia", type=float, default=0.0, help="segundos por peticion")
+  p.set_defaults(funcion=benchCiclo)
+
+  p = sub.add_parser("ingesta", help="importar una lista en bruto sintetica")
+  p.add_argument("--lineas", type=int, default=1000000)
+  p.add_argument("--autores", type=int, default=5000)
+  p.set_defaults(funcion=benchIngesta)
+
+  p = sub.add_parser("selector", help="elecciones por segundo del selector de libros")
+  p.add_argument("--titulos", default="10000,100000,1000000", help="tamaños separados por comas")
+  p.add_argument("--elecciones", type=int, default=100000)
+  p.add_argument("--ventana", type=int, default=5)
+  p.set_defaults(funcion=benchSelector)
+
+  p = sub.add_parser("arranque", help="tiempo de arranque en frio de main.py")
+  p.add_argument("--repeticiones", type=int, default=10)
+  p.add_argument("--presupuesto", type=float, default=0.3, help="segundos")
+  p.set_defaults(funcion=benchArranque)
+
+  args = parser.parse_args()
+  args.funcion(args)
+
+
+if __name__ == "__main__":
+  main()
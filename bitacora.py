@@ -0,0 +1,99 @@
+import asyncio, json, os, uuid
+
+# Registro de escritura anticipada de cada ciclo: elegido -> resumido ->
+# publicado -> respondido. Cada paso se anota antes de pasar al siguiente y
+# las anotaciones que llegan a la vez se escriben con un solo fsync. Al
+# arrancar se compacta el archivo dejando solo los ciclos sin terminar, asi
+# que reanudarlos cuesta O(pendientes) y no depende de la historia.
+
+
+class Bitacora:
+  def __init__(self, ruta="bitacora.jsonl", compactarCada=1000):
+    self.ruta = ruta
+    self.compactarCada = compactarCada
+    self.pendientes = {}
+    self._cola = []
+    self._anotados = 0
+    self._escritos = 0
+    self._lineas = 0
+    self._archivo = None
+    self._cerrojo = None
+
+  def cargar(self):
+    # Devuelve los ciclos sin terminar, en el orden en que empezaron.
+    if os.path.exists(self.ruta):
+      with open(self.ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+          try:
+            registro = json.loads(linea)
+          except ValueError:
+            # Ultima linea a medio escribir: ese paso no llego a darse.
+            continue
+          self._aplicar(registro)
+    self._compactar(self._instantanea())
+    return [dict(ciclo) for ciclo in self.pendientes.values()]
+
+  def nuevo(self):
+    return {"ciclo": uuid.uuid4().hex}
+
+  async def anotar(self, ciclo, paso, **datos):
+    ciclo.update(datos, paso=paso)
+    self._aplicar(dict(datos, ciclo=ciclo["ciclo"], paso=paso))
+    self._cola.append(json.dumps(dict(datos, ciclo=ciclo["ciclo"], paso=paso),
+                                 ensure_ascii=False) + "\n")
+    self._anotados += 1
+    propio = self._anotados
+    if self._cerrojo is None:
+      self._cerrojo = asyncio.Lock()
+    async with self._cerrojo:
+      # Si otro ciclo ya escribio nuestra linea mientras esperabamos, listo.
+      if self._escritos >= propio:
+        return
+      lote, self._cola = self._cola, []
+      hasta = self._anotados
+      await asyncio.to_thread(self._escribir, lote)
+      self._escritos = hasta
+      if self._lineas >= self.compactarCada:
+        await asyncio.to_thread(self._compactar, self._instantanea())
+
+  def _aplicar(self, registro):
+    ciclo = registro["ciclo"]
+    if registro["paso"] == "respondido":
+      self.pendientes.pop(ciclo, None)
+    else:
+      self.pendientes.setdefault(ciclo, {"ciclo": ciclo}).update(registro)
+
+  def _escribir(self, lineas):
+    if self._archivo is None:
+      self._archivo = open(self.ruta, "a", encoding="utf-8")
+    self._archivo.write("".join(lineas))
+    self._archivo.flush()
+    os.fsync(self._archivo.fileno())
+    self._lineas += len(lineas)
+
+  def _instantanea(self):
+    return [dict(ciclo) for ciclo in self.pendientes.values()]
+
+  def _compactar(self, ciclos):
+    # Reescribe el archivo con el ultimo estado de cada ciclo pendiente.
+    if self._archivo is not None:
+      self._archivo.close()
+      self._archivo = None
+    temporal = f"{self.ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+      for ciclo in ciclos:
+        f.write(json.dumps(ciclo, ensure_ascii=False) + "\n")
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(temporal, self.ruta)
+    carpeta = os.open(os.path.dirname(os.path.abspath(self.ruta)), os.O_RDONLY)
+    try:
+      os.fsync(carpeta)
+    finally:
+      os.close(carpeta)
+    self._lineas = len(ciclos)
+
+  def cerrar(self):
+    if self._archivo is not None:
+      self._archivo.close()
+      self._archivo = None
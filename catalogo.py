@@ -0,0 +1,274 @@
+import os, random, sqlite3, sys, threading, time
+from ingesta import Autores, Normalizador, leerLineas
+
+# Catalogo de libros en SQLite. Cada eleccion sortea ids hasta dar con un
+# libro libre (O(1) esperado mientras quede una parte razonable libre) y lo
+# marca como usado en la misma transaccion, sin cargar nunca la lista completa en memoria. Los libros se
+# guardan normalizados por ingesta.py y la clave normalizada es unica, asi que
+# los duplicados se descartan al insertar. Con un selector (selector.py) la
+# eleccion se hace en memoria, con cubetas por autor, y la base de datos solo
+# marca el libro elegido.
+
+# Sorteos de ids antes de recurrir a contar los libros libres.
+INTENTOS = 32
+
+ESQUEMA = [
+  """CREATE TABLE IF NOT EXISTS libros (
+    id INTEGER PRIMARY KEY,
+    libro TEXT NOT NULL,
+    autor TEXT NOT NULL DEFAULT '',
+    clave TEXT NOT NULL UNIQUE,
+    usado INTEGER NOT NULL DEFAULT 0,
+    usado_en REAL
+  )""",
+  "CREATE INDEX IF NOT EXISTS libres ON libros(id) WHERE usado = 0",
+  "CREATE INDEX IF NOT EXISTS recientes ON libros(usado_en) WHERE usado_en IS NOT NULL",
+  "CREATE INDEX IF NOT EXISTS autores ON libros(autor)",
+  """CREATE TABLE IF NOT EXISTS cola (
+    orden INTEGER PRIMARY KEY AUTOINCREMENT,
+    libro TEXT NOT NULL
+  )""",
+]
+
+
+class Catalogo:
+  def __init__(self, ruta="catalogo.db", selector=None):
+    self.ruta = ruta
+    self.selector = selector
+    self._selectorCargado = False
+    self._ultimoId = 0
+    self._local = threading.local()
+
+  def _conexion(self):
+    con = getattr(self._local, "con", None)
+    if con is None:
+      con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+      con.execute("PRAGMA journal_mode=WAL")
+      con.execute("PRAGMA synchronous=NORMAL")
+      # Cache de paginas mas grande para que importar listas grandes no
+      # se vuelva lento al crecer los indices.
+      con.execute("PRAGMA cache_size=-65536")
+      self._local.con = con
+      columnas = [fila[1] for fila in con.execute("PRAGMA table_info(libros)")]
+      if columnas and "clave" not in columnas:
+        self._transaccion(self._migrar)
+      else:
+        if columnas and "usado_en" not in columnas:
+          con.execute("ALTER TABLE libros ADD COLUMN usado_en REAL")
+        for sql in ESQUEMA:
+          con.execute(sql)
+    return con
+
+  def _migrar(self, con):
+    # Catalogos anteriores a la ingesta: se vuelven a crear con los libros
+    # normalizados, juntando duplicados y conservando cuales se han usado.
+    con.execute("ALTER TABLE libros RENAME TO libros_viejos")
+    con.execute("DROP INDEX IF EXISTS libres")
+    for sql in ESQUEMA:
+      con.execute(sql)
+    normalizador = Normalizador()
+    filas = con.execute("SELECT libro, usado FROM libros_viejos ORDER BY id").fetchall()
+    for libro, usado in filas:
+      registro = normalizador.registro(libro)
+      if registro is not None:
+        con.execute(
+          "INSERT INTO libros (libro, autor, clave, usado) VALUES (?, ?, ?, ?) "
+          "ON CONFLICT(clave) DO UPDATE SET usado = max(usado, excluded.usado)",
+          registro + (usado, ))
+    for orden, libro in con.execute("SELECT orden, libro FROM cola").fetchall():
+      registro = normalizador.registro(libro)
+      if registro is not None:
+        con.execute("UPDATE cola SET libro = ? WHERE orden = ?", (registro[0], orden))
+    con.execute("DROP TABLE libros_viejos")
+
+  def _normalizador(self):
+    # Los autores ya guardados se usan como canonicos para los nuevos.
+    normalizador = getattr(self._local, "normalizador", None)
+    if normalizador is None:
+      autores = Autores()
+      for (autor, ) in self._conexion().execute(
+          "SELECT DISTINCT autor FROM libros WHERE autor != ''"):
+        autores.canonico(autor)
+      normalizador = self._local.normalizador = Normalizador(autores)
+    return normalizador
+
+  def elegir(self):
+    return self._transaccion(self._elegir)
+
+  def reservar(self):
+    # Elige un libro y lo deja en la cola de proximas publicaciones.
+    def reservar(con):
+      libro = self._elegir(con)
+      con.execute("INSERT INTO cola (libro) VALUES (?)", (libro, ))
+      return libro
+    return self._transaccion(reservar)
+
+  def primero(self):
+    # (orden, libro) del primero de la cola, sin sacarlo; si la cola esta
+    # vacia se reserva uno. Quien lo publica lo anota antes en su bitacora y
+    # despues lo saca con sacarDeCola(), asi una caida entre medias no pierde
+    # el libro.
+    def primero(con):
+      fila = con.execute(
+        "SELECT orden, libro FROM cola ORDER BY orden LIMIT 1").fetchone()
+      if fila is None:
+        libro = self._elegir(con)
+        con.execute("INSERT INTO cola (libro) VALUES (?)", (libro, ))
+        fila = (con.execute("SELECT last_insert_rowid()").fetchone()[0], libro)
+      return fila
+    return self._transaccion(primero)
+
+  def sacarDeCola(self, orden):
+    self._conexion().execute("DELETE FROM cola WHERE orden = ?", (orden, ))
+
+  def proximos(self):
+    con = self._conexion()
+    return [fila[0] for fila in con.execute("SELECT libro FROM cola ORDER BY orden")]
+
+  def _transaccion(self, funcion):
+    con = self._conexion()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+      resultado = funcion(con)
+      con.execute("COMMIT")
+    except BaseException:
+      con.execute("ROLLBACK")
+      raise
+    return resultado
+
+  def _elegir(self, con):
+    if self.selector is not None:
+      self._cargarSelector(con)
+      self._ponerAlDia(con)
+      while True:
+        # Otro proceso (import-catalog con usados.txt) puede haber marcado el
+        # libro como usado despues de cargar el selector: ya ha salido del
+        # selector al elegirlo, asi que basta con elegir otro.
+        id = self.selector.elegir()
+        if con.execute("UPDATE libros SET usado = 1, usado_en = ? WHERE id = ? AND usado = 0",
+                       (time.time(), id)).rowcount:
+          return con.execute("SELECT libro FROM libros WHERE id = ?", (id, )).fetchone()[0]
+    fila = self._libre(con)
+    if fila is None:
+      raise LookupError("No quedan libros sin usar en el catalogo")
+    con.execute("UPDATE libros SET usado = 1, usado_en = ? WHERE id = ?", (time.time(), fila[0]))
+    return fila[1]
+
+  def _libre(self, con):
+    # Se sortean ids hasta dar con uno libre, asi todos los libros libres
+    # tienen la misma probabilidad aunque los usados esten agrupados. Si casi
+    # todo el catalogo esta usado, se salta a un libre al azar con OFFSET
+    # sobre el indice parcial, que cuesta O(libres).
+    maximo = con.execute("SELECT max(id) FROM libros").fetchone()[0]
+    if maximo is None:
+      return None
+    for _ in range(INTENTOS):
+      fila = con.execute("SELECT id, libro FROM libros WHERE id = ? AND usado = 0",
+                         (random.randint(1, maximo), )).fetchone()
+      if fila is not None:
+        return fila
+    libres = con.execute("SELECT count(*) FROM libros WHERE usado = 0").fetchone()[0]
+    if not libres:
+      return None
+    return con.execute(
+      "SELECT id, libro FROM libros WHERE usado = 0 ORDER BY id LIMIT 1 OFFSET ?",
+      (random.randrange(libres), )).fetchone()
+
+  def _cargarSelector(self, con):
+    # Se llena una sola vez, con los libros libres; despues se mantiene al
+    # dia en agregar() y marcarUsados(). Los ultimos libros elegidos (los
+    # publicados y los que estan en la cola) llenan la ventana de autores
+    # recientes, asi que reiniciar no permite repetir autor.
+    if self._selectorCargado:
+      return
+    for id, libro, autor in con.execute("SELECT id, libro, autor FROM libros WHERE usado = 0"):
+      self.selector.agregar(id, libro, autor)
+    self._ultimoId = con.execute("SELECT coalesce(max(id), 0) FROM libros").fetchone()[0]
+    ultimos = con.execute(
+      "SELECT autor FROM libros WHERE usado_en IS NOT NULL ORDER BY usado_en DESC, id DESC "
+      "LIMIT ?", (max(self.selector.ventana, self.selector.ventanaGenero), )).fetchall()
+    for (autor, ) in reversed(ultimos):
+      self.selector.recordar(autor)
+    self._selectorCargado = True
+
+  def _ponerAlDia(self, con):
+    # Libros insertados despues de cargar el selector, tambien por otro
+    # proceso (import-catalog): los ids solo crecen, asi que basta con mirar
+    # los que pasan del ultimo visto. Es una busqueda en la clave primaria y
+    # se hace en cada eleccion.
+    for id, libro, autor, usado in con.execute(
+        "SELECT id, libro, autor, usado FROM libros WHERE id > ? ORDER BY id",
+        (self._ultimoId, )):
+      if not usado:
+        self.selector.agregar(id, libro, autor)
+      self._ultimoId = id
+
+  def marcarUsados(self, libros):
+    registros = self._normalizador().registros(libros)
+    if not self._selectorCargado:
+      self._transaccion(lambda con: con.executemany(
+        "UPDATE libros SET usado = 1 WHERE clave = ?",
+        ((clave, ) for _, _, clave in registros)))
+      return
+    def marcar(con):
+      for _, _, clave in registros:
+        fila = con.execute("SELECT id FROM libros WHERE clave = ? AND usado = 0",
+                           (clave, )).fetchone()
+        if fila is not None:
+          con.execute("UPDATE libros SET usado = 1 WHERE id = ?", fila)
+          self.selector.quitar(fila[0])
+    self._transaccion(marcar)
+
+  def agregar(self, libros):
+    # Acepta lineas en bruto ("12. Titulo - Autor"); devuelve cuantos libros
+    # nuevos se insertaron.
+    registros = self._normalizador().registros(libros)
+    con = self._conexion()
+    antes = con.total_changes
+    def agregar(con):
+      con.executemany(
+        "INSERT OR IGNORE INTO libros (libro, autor, clave) VALUES (?, ?, ?)", registros)
+      if self._selectorCargado:
+        self._ponerAlDia(con)
+    self._transaccion(agregar)
+    return con.total_changes - antes
+
+  def recorrer(self, soloLibres=True, bloque=1000):
+    # Recorre el catalogo por bloques de ids sin mantener abierta una lectura.
+    con = self._conexion()
+    filtro = "AND usado = 0" if soloLibres else ""
+    ultimo = 0
+    while True:
+      filas = con.execute(
+        f"SELECT id, libro FROM libros WHERE id > ? {filtro} ORDER BY id LIMIT ?",
+        (ultimo, bloque)).fetchall()
+      if not filas:
+        return
+      for _, libro in filas:
+        yield libro
+      ultimo = filas[-1][0]
+
+  def libres(self):
+    con = self._conexion()
+    return con.execute("SELECT count(*) FROM libros WHERE usado = 0").fetchone()[0]
+
+  def vacio(self):
+    con = self._conexion()
+    return con.execute("SELECT 1 FROM libros LIMIT 1").fetchone() is None
+
+
+def importar(catalogo, lista="lista.txt", usados="usados.txt"):
+  # La lista puede ser un libro por linea (lista_raw.txt) o el literal de
+  # Python antiguo (lista.txt); usados.txt tiene un libro por linea.
+  nuevos = catalogo.agregar(leerLineas(lista))
+  if usados and os.path.exists(usados):
+    catalogo.marcarUsados(leerLineas(usados))
+  return nuevos
+
+
+if __name__ == "__main__":
+  # python catalogo.py [catalogo.db] [lista.txt] [usados.txt]
+  args = sys.argv[1:]
+  catalogo = Catalogo(args[0] if args else "catalogo.db")
+  importar(catalogo, *args[1:3])
+  print(f"{catalogo.libres()} libros disponibles")
@@ -0,0 +1,117 @@
+import asyncio, json, os, time
+
+import requests
+from requests.adapters import HTTPAdapter
+from mastodon import Mastodon, MastodonRatelimitError
+
+from metricas import etapa
+
+# Varias cuentas en varias instancias desde un mismo proceso. Cada instancia
+# tiene una sesion HTTP con keep-alive compartida por todas sus cuentas, un
+# limite de peticiones simultaneas y una pausa comun cuando el servidor
+# devuelve un error de limite de peticiones.
+
+INSTANCIA_POR_DEFECTO = "https://mastodon.social"
+
+
+def cargarCuentas(ruta="cuentas.json"):
+  # Sin archivo de configuracion se usa la cuenta de siempre: token_mast en
+  # mastodon.social.
+  if not os.path.exists(ruta):
+    return [{"nombre": "principal", "instancia": INSTANCIA_POR_DEFECTO,
+             "token": os.environ["token_mast"]}]
+  with open(ruta, "r") as f:
+    config = json.load(f)
+  cuentas = []
+  for cuenta in config["cuentas"]:
+    cuenta = dict(cuenta)
+    cuenta.setdefault("instancia", INSTANCIA_POR_DEFECTO)
+    if "token" not in cuenta:
+      cuenta["token"] = os.environ[cuenta["token_env"]]
+    cuentas.append(cuenta)
+  return cuentas
+
+
+class Instancia:
+  def __init__(self, url, concurrencia=4, reintentos=3):
+    self.url = url
+    self.reintentos = reintentos
+    self.sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=concurrencia)
+    self.sesion.mount("https://", adaptador)
+    self.sesion.mount("http://", adaptador)
+    self._concurrencia = concurrencia
+    self._semaforo = None
+    self._pausaHasta = 0
+
+  async def llamar(self, funcion, *args, **kwargs):
+    if self._semaforo is None:
+      self._semaforo = asyncio.Semaphore(self._concurrencia)
+    for intento in range(self.reintentos + 1):
+      async with self._semaforo:
+        espera = self._pausaHasta - time.time()
+        if espera > 0:
+          await asyncio.sleep(espera)
+        try:
+          with etapa("mastodon", instancia=self.url) as medida:
+            medida.bytes = sum(len(str(arg).encode("utf-8")) for arg in args)
+            return await asyncio.to_thread(funcion, *args, **kwargs)
+        except MastodonRatelimitError:
+          if intento == self.reintentos:
+            raise
+          # Mastodon.py guarda en el cliente cuando se reinicia el limite;
+          # como mucho se esperan 5 minutos, igual que hace Mastodon.py.
+          ahora = time.time()
+          reinicio = min(getattr(funcion.__self__, "ratelimit_reset", 0), ahora + 300)
+          self._pausaHasta = max(self._pausaHasta, reinicio, ahora + 2 ** intento)
+
+
+class Flota:
+  def __init__(self, cuentas, concurrencia=4):
+    self.instancias = {}
+    self.clientes = {}
+    for cuenta in cuentas:
+      url = cuenta["instancia"].rstrip("/")
+      if url not in self.instancias:
+        self.instancias[url] = Instancia(url, concurrencia)
+      instancia = self.instancias[url]
+      self.clientes[cuenta["nombre"]] = (instancia, Mastodon(
+        access_token=cuenta["token"], api_base_url=url, session=instancia.sesion,
+        ratelimit_method="throw"))
+
+  async def publicar(self, texto, clave=None):
+    # Devuelve {cuenta: toot} con las cuentas en las que se pudo publicar.
+    # Con `clave`, repetir la llamada (por ejemplo al reanudar tras una
+    # caida) no duplica el toot: Mastodon respeta la Idempotency-Key.
+    return await self._difundir(
+      {nombre: ((texto, ), self._idempotencia(clave, nombre)) for nombre in self.clientes})
+
+  async def responder(self, texto, toots, clave=None):
+    return await self._difundir(
+      {nombre: ((texto, ), dict(self._idempotencia(clave, nombre), in_reply_to_id=toot))
+       for nombre, toot in toots.items()})
+
+  @staticmethod
+  def _idempotencia(clave, nombre):
+    return {"idempotency_key": f"{clave}-{nombre}"} if clave else {}
+
+  async def _difundir(self, llamadas):
+    nombres = list(llamadas)
+    resultados = await asyncio.gather(
+      *(self._llamar(nombre, *llamadas[nombre]) for nombre in nombres),
+      return_exceptions=True)
+    publicados = {}
+    for nombre, resultado in zip(nombres, resultados):
+      if isinstance(resultado, Exception):
+        print(f"Error publicando en {nombre}: {resultado!r}")
+      else:
+        publicados[nombre] = resultado
+    return publicados
+
+  def _llamar(self, nombre, args, kwargs):
+    instancia, cliente = self.clientes[nombre]
+    return instancia.llamar(cliente.status_post, *args, **kwargs)
+
+  def cerrar(self):
+    for instancia in self.instancias.values():
+      instancia.sesion.close()
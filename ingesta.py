@@ -0,0 +1,190 @@
+import ast, json, re, sys, unicodedata
+
+# Ingesta de listas de libros de cualquier tamaño, linea a linea: repara el
+# UTF-8 doblemente codificado y las tildes en mayuscula a media palabra,
+# quita la numeracion, separa titulo y autor y calcula una clave normalizada
+# para detectar duplicados. Las variantes de un mismo autor
+# ("Dostoiewski"/"Dostoieswski") se unifican comparando solo con los autores
+# de su mismo bloque, asi que el coste es lineal en el numero de lineas.
+
+# Caracter -> byte tal y como se ven los bytes 0x80-0xFF al leer UTF-8 como
+# cp1252 (o latin-1 para los huecos de cp1252).
+_BYTES = {}
+for _b in range(0x80, 0x100):
+  _BYTES[chr(_b)] = _b
+  try:
+    _BYTES[bytes([_b]).decode("cp1252")] = _b
+  except UnicodeDecodeError:
+    pass
+_INICIO = "".join(re.escape(c) for c, b in _BYTES.items() if 0xC2 <= b <= 0xF4)
+_CONTINUACION = "".join(re.escape(c) for c, b in _BYTES.items() if 0x80 <= b <= 0xBF)
+_MOJIBAKE = re.compile(f"[{_INICIO}][{_CONTINUACION}]{{1,3}}")
+
+_TILDES = "ÁÉÍÓÚÑÜ"
+_TILDE_INTERIOR = re.compile(f"(?<=\\w)[{_TILDES}]")
+_PALABRA = re.compile(r"\w+")
+_NUMERACION = re.compile(r"^\s*\d+\s*[.)]\s+")
+_NOTA = re.compile(r"\s*[\[(][^\])]*[\])]")
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def _decodificar(m):
+  try:
+    return bytes(_BYTES[c] for c in m.group()).decode("utf-8")
+  except UnicodeDecodeError:
+    return m.group()
+
+
+def _minusculas(m):
+  palabra = m.group()
+  if len(palabra) < 2 or not any(c.islower() for c in palabra):
+    return palabra
+  return palabra[0] + "".join(c.lower() if c in _TILDES else c for c in palabra[1:])
+
+
+def reparar(texto):
+  if texto.isascii():
+    return texto
+  texto = _MOJIBAKE.sub(_decodificar, texto)
+  if _TILDE_INTERIOR.search(texto):
+    texto = _PALABRA.sub(_minusculas, texto)
+  return texto
+
+
+def clave(texto):
+  if not texto.isascii():
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+  return _NO_ALFANUMERICO.sub(" ", texto.lower()).strip()
+
+
+def separar(linea):
+  # "12. Titulo - Autor" -> ("Titulo", "Autor"); el autor es lo que va
+  # despues del ultimo guion con un espacio a algun lado.
+  linea = _NUMERACION.sub("", linea.strip())
+  i = max(linea.rfind("-"), linea.rfind("–"))
+  while i > 0:
+    if linea[i - 1].isspace() or linea[i + 1:i + 2].isspace():
+      return linea[:i].strip(), linea[i + 1:].strip()
+    i = max(linea.rfind("-", 0, i), linea.rfind("–", 0, i))
+  return linea, ""
+
+
+def _distancia(a, b, limite):
+  # Distancia de Damerau-Levenshtein (alineamiento optimo: dos letras
+  # contiguas cambiadas de orden cuentan como un error), cortando en cuanto
+  # pasa de `limite`.
+  previa = None
+  anterior = list(range(len(b) + 1))
+  for i, ca in enumerate(a, 1):
+    actual = [i]
+    for j, cb in enumerate(b, 1):
+      d = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+      if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+        d = min(d, previa[j - 2] + 1)
+      actual.append(d)
+    if min(actual) > limite:
+      return limite + 1
+    previa, anterior = anterior, actual
+  return anterior[-1]
+
+
+class Autores:
+  # Nombre canonico de cada autor. Dos nombres se unifican solo si difieren
+  # en una palabra que no es la primera ni un numero, y en pocas letras: en
+  # el apellido (la ultima palabra que no es un numero) un error por cada
+  # `letrasPorError` letras, y en un nombre intermedio de al menos 4 letras
+  # un error, porque el resto del nombre ya coincide. Asi
+  # "Dostoiewski"/"Dostoieswki", "Rosseau"/"Rousseau" o "Jacabo"/"Jacobo"
+  # se juntan pero "Juan"/"Juana" o "Marti"/"Martin" no. Cada nombre se
+  # guarda en un bloque por cada palabra que podria variar, con el resto del
+  # nombre exacto como clave, y solo se compara con los nombres de esos
+  # bloques.
+  def __init__(self, letrasPorError=7):
+    self.letrasPorError = letrasPorError
+    self.canonicos = {}
+    self.bloques = {}
+    self._vistos = {}
+
+  def canonico(self, autor):
+    nombre = self._vistos.get(autor)
+    if nombre is None:
+      nombre = self._vistos[autor] = self._canonico(autor)
+    return nombre
+
+  def _canonico(self, autor):
+    palabras = clave(_NOTA.sub("", autor)).split()
+    if not palabras:
+      return autor
+    # Sin espacios, para que "MarkTwain" y "Mark Twain" sean el mismo.
+    k = "".join(palabras)
+    nombre = self.canonicos.get(k)
+    if nombre is not None:
+      return nombre
+    bloques = list(self._bloques(palabras))
+    for palabra, apellido, bloque in bloques:
+      for otra, otroNombre in bloque:
+        letras = min(len(palabra), len(otra))
+        limite = letras // self.letrasPorError if apellido else int(letras >= 4)
+        if limite and abs(len(palabra) - len(otra)) <= limite \
+            and _distancia(palabra, otra, limite) <= limite:
+          self.canonicos[k] = otroNombre
+          return otroNombre
+    nombre = _NOTA.sub("", autor).strip()
+    for palabra, _, bloque in bloques:
+      bloque.append((palabra, nombre))
+    self.canonicos[k] = nombre
+    return nombre
+
+  def _bloques(self, palabras):
+    # (palabra, si es el apellido, bloque) por cada palabra que puede variar.
+    variables = [i for i in range(1, len(palabras)) if not palabras[i].isdigit()]
+    for i in variables:
+      yield palabras[i], i == variables[-1], self.bloques.setdefault(
+        (tuple(palabras[:i]), tuple(palabras[i + 1:]), palabras[i][0]), [])
+
+
+class Normalizador:
+  def __init__(self, autores=None):
+    self.autores = autores or Autores()
+    self._claves = {}
+
+  def registro(self, linea):
+    # (libro, autor, clave) o None si la linea esta vacia.
+    titulo, autor = separar(reparar(linea))
+    if not titulo:
+      return None
+    claveAutor = ""
+    if autor:
+      autor = self.autores.canonico(autor)
+      claveAutor = self._claves.get(autor)
+      if claveAutor is None:
+        claveAutor = self._claves[autor] = clave(autor)
+    libro = f"{titulo} - {autor}" if autor else titulo
+    return libro, autor, f"{clave(titulo)}|{claveAutor}"
+
+  def registros(self, lineas):
+    for linea in lineas:
+      registro = self.registro(linea)
+      if registro is not None:
+        yield registro
+
+
+def leerLineas(ruta):
+  # Una linea por libro; el formato antiguo (un literal de Python en una sola
+  # linea, como lista.txt) tambien se acepta.
+  with open(ruta, "r", encoding="utf-8", errors="replace") as f:
+    primera = f.readline()
+    if primera.lstrip().startswith("["):
+      yield from ast.literal_eval(primera + f.read())
+      return
+    yield primera
+    yield from f
+
+
+if __name__ == "__main__":
+  # python ingesta.py lista_raw.txt > libros.jsonl
+  vistos = set()
+  for libro, autor, k in Normalizador().registros(leerLineas(sys.argv[1])):
+    if k not in vistos:
+      vistos.add(k)
+      print(json.dumps({"libro": libro, "autor": autor, "clave": k}, ensure_ascii=False))
@@ -1,51 +1,234 @@
-import openai
-import  requests, json, time, os, random, schedule
-from requests.auth import HTTPBasicAuth
-from mastodon import Mastodon
-
-token = os.environ['token_mast']
-openAiSecret = os.environ['openAiSecret']
-org_id = os.environ['org_id']
-openai.organization = org_id
-openai.api_key = openAiSecret
-openai.Model.list()
+import argparse, asyncio, logging, os, sys, time
+import metricas
+from bitacora import Bitacora
+from catalogo import Catalogo, importar
+from metricas import etapa
+from planificador import Planificador
+from resumenes import CacheResumenes, Pregenerador, Resumidor, getOpenAI
+
+# Los clientes se crean la primera vez que se usan: importar este modulo no
+# necesita credenciales, no abre conexiones ni arranca el bucle.
+
+intervalo = float(os.environ.get("intervalo", 7200))
+retraso_respuesta = float(os.environ.get("retraso_respuesta", 900))
+reintento_respuesta = float(os.environ.get("reintento_respuesta", 300))
+
+_catalogo = None
+_resumidor = None
+_pregenerador = None
+_flota = None
+_planificador = None
+_bitacora = None
+_enCurso = set()
+_eleccion = None
+
+def getCatalogo():
+  global _catalogo
+  if _catalogo is None:
+    from selector import Selector
+    _catalogo = Catalogo("catalogo.db", Selector.desdeArchivo("selector.json")
+                         if os.path.exists("selector.json") else Selector())
+    if _catalogo.vacio() and os.path.exists("lista.txt"):
+      importar(_catalogo, "lista.txt", "usados.txt")
+  return _catalogo
+
+def getResumidor():
+  global _resumidor
+  if _resumidor is None:
+    _resumidor = Resumidor(CacheResumenes(
+      "resumenes.db",
+      max_entradas=int(os.environ.get("cache_max_entradas", 10000)),
+      max_edad=float(os.environ.get("cache_max_dias", 90)) * 86400))
+  return _resumidor
+
+def getPregenerador():
+  global _pregenerador
+  if _pregenerador is None:
+    _pregenerador = Pregenerador(getCatalogo(), getResumidor(),
+                                 cantidad=int(os.environ.get("proximos", 3)))
+  return _pregenerador
+
+def getFlota():
+  global _flota
+  if _flota is None:
+    from cuentas import Flota, cargarCuentas
+    _flota = Flota(cargarCuentas("cuentas.json"))
+  return _flota
+
+def getBitacora():
+  global _bitacora
+  if _bitacora is None:
+    _bitacora = Bitacora("bitacora.jsonl")
+    _bitacora.cargar()
+  return _bitacora
+
+def getPlanificador():
+  global _planificador
+  if _planificador is None:
+    _planificador = Planificador()
+  return _planificador
 
 def getBook():
-  with open("lista.txt", "r") as f:
-    lista = eval(f.read())
-  with open("usados.txt", "r") as f:
-    usados = f.read()
-  usados = usados.split("\n")
-  #print(usados)
-  disponibles = []
-  for libro in lista:
-    if libro not in usados:
-      disponibles.append(libro)
-  
-  
-  libro = random.choice(disponibles)
-  with open("usados.txt", "a+") as f:
-    f.write(f"\n{libro}")
+  # (orden, libro): el libro sigue en la cola hasta que se anota en la
+  # bitacora.
+  with etapa("eleccion") as medida:
+    orden, libro = getCatalogo().primero()
+    medida.bytes = len(libro.encode("utf-8"))
   print(libro)
-  return libro
+  return orden, libro
 def getResumen(libro):
-  prompt = f"sumarice {libro} in 50 words in spanish. Sin decir el titulo ni el autor"
-  request = openai.Completion.create(
-        model="text-davinci-003", prompt=prompt, max_tokens=200,temperature=1)
-  resumen = request["choices"][0]["text"].strip().capitalize()
+  with etapa("resumen") as medida:
+    resumen = getResumidor().resumen(libro)
+    medida.bytes = len(resumen.encode("utf-8"))
   return resumen
 
-def publicarToot():
-  mastodon = Mastodon(
-      access_token = token,
-      api_base_url = 'https://mastodon.social'
-  )
-  libro = getBook()
-  toot = toot=mastodon.toot(getResumen(libro))
-  time.sleep(900)
-  mastodon.status_post(libro , in_reply_to_id = toot)
-
-schedule.every(2).hours.do(publicarToot)
-while True:
-  schedule.run_pending()
-  time.sleep(1)
+async def publicarToot():
+  global _eleccion
+  # Un ciclo que se quedo sin publicar (por ejemplo, porque fallaron todas
+  # las cuentas) va antes que elegir un libro nuevo.
+  ciclo = next((dict(c) for c in getBitacora().pendientes.values()
+                if c["paso"] in ("elegido", "resumido") and c["ciclo"] not in _enCurso), None)
+  if ciclo is None:
+    if _eleccion is None:
+      _eleccion = asyncio.Lock()
+    ciclo = getBitacora().nuevo()
+    # Dos ciclos a la vez no pueden tomar el mismo primero de la cola.
+    async with _eleccion:
+      orden, libro = await asyncio.to_thread(getBook)
+      await getBitacora().anotar(ciclo, "elegido", libro=libro, orden=orden)
+      await asyncio.to_thread(getCatalogo().sacarDeCola, orden)
+    getPregenerador().despertar()
+  await continuar(ciclo)
+
+async def continuar(ciclo):
+  # Lleva un ciclo desde el ultimo paso anotado en la bitacora hasta
+  # programar la respuesta; sirve igual para ciclos nuevos y para reanudar.
+  _enCurso.add(ciclo["ciclo"])
+  try:
+    if ciclo["paso"] == "elegido":
+      resumen = await asyncio.to_thread(getResumen, ciclo["libro"])
+      await getBitacora().anotar(ciclo, "resumido", resumen=resumen)
+    if ciclo["paso"] == "resumido":
+      with etapa("toot") as medida:
+        toots = await getFlota().publicar(ciclo["resumen"], clave=ciclo["ciclo"])
+        medida.bytes = len(ciclo["resumen"].encode("utf-8")) * len(toots)
+        medida.resultado = _resultado(toots)
+      exportarMetricas()
+      if not toots:
+        return
+      await getBitacora().anotar(
+        ciclo, "publicado", toots={nombre: toot["id"] for nombre, toot in toots.items()},
+        responder_en=time.time() + retraso_respuesta)
+    if ciclo["paso"] == "publicado":
+      getPlanificador().en(max(0, ciclo["responder_en"] - time.time()), responder, ciclo)
+  finally:
+    _enCurso.discard(ciclo["ciclo"])
+
+async def responder(ciclo):
+  with etapa("respuesta") as medida:
+    respuestas = await getFlota().responder(ciclo["libro"], ciclo["toots"],
+                                            clave=f"{ciclo['ciclo']}-respuesta")
+    medida.bytes = len(ciclo["libro"].encode("utf-8")) * len(respuestas)
+    medida.resultado = _resultado(respuestas, len(ciclo["toots"]))
+  faltan = {nombre: toot for nombre, toot in ciclo["toots"].items() if nombre not in respuestas}
+  if faltan:
+    # Las cuentas en las que fallo la respuesta siguen pendientes y se
+    # reintentan mas tarde.
+    await getBitacora().anotar(ciclo, "publicado", toots=faltan,
+                               responder_en=time.time() + reintento_respuesta)
+    getPlanificador().en(reintento_respuesta, responder, ciclo)
+  else:
+    await getBitacora().anotar(ciclo, "respondido")
+  exportarMetricas()
+
+def reanudar():
+  # Ciclos que quedaron a medias en la ultima ejecucion. Si la caida fue
+  # justo despues de anotar la eleccion, el libro sigue en la cola.
+  for ciclo in list(getBitacora().pendientes.values()):
+    print(f"Reanudando {ciclo['libro']} desde '{ciclo['paso']}'")
+    if "orden" in ciclo:
+      getCatalogo().sacarDeCola(ciclo["orden"])
+    getPlanificador().en(0, continuar, dict(ciclo))
+
+def _resultado(publicados, esperados=None):
+  esperados = len(getFlota().clientes) if esperados is None else esperados
+  if not publicados:
+    return "error"
+  return "ok" if len(publicados) == esperados else "parcial"
+
+def exportarMetricas():
+  if os.environ.get("metricas_archivo"):
+    metricas.escribir(os.environ["metricas_archivo"])
+
+def validar():
+  # Comprueba credenciales de OpenAI y de todas las cuentas antes de empezar.
+  getOpenAI().Model.list()
+  for nombre, (_, cliente) in getFlota().clientes.items():
+    cliente.account_verify_credentials()
+    print(f"Cuenta {nombre} verificada")
+
+def run(args):
+  if args.validar:
+    validar()
+  if os.environ.get("metricas_puerto"):
+    metricas.servir(int(os.environ["metricas_puerto"]))
+  getPregenerador().iniciar()
+  reanudar()
+  getPlanificador().cada(intervalo, publicarToot)
+  asyncio.run(getPlanificador().ejecutar())
+
+def postOnce(args):
+  if args.validar:
+    validar()
+  reanudar()
+  getPlanificador().en(0, publicarToot)
+  asyncio.run(getPlanificador().ejecutar())
+
+def dryRun(args):
+  # Muestra el libro y el resumen que se publicarian, sin tocar el catalogo
+  # ni publicar nada. Solo se sabe cual es el proximo libro si ya esta en la
+  # cola; si no, se elige al publicar.
+  if not os.path.exists("catalogo.db"):
+    sys.exit("No hay catalogo; importalo con `main.py import-catalog`")
+  proximos = Catalogo("catalogo.db").proximos()
+  if not proximos:
+    sys.exit("La cola esta vacia: el proximo libro se elegira al publicar")
+  print(proximos[0])
+  if not args.sin_resumen:
+    print(getResumen(proximos[0]))
+
+def importCatalog(args):
+  catalogo = Catalogo(args.catalogo)
+  nuevos = importar(catalogo, args.lista, args.usados)
+  print(f"{nuevos} libros nuevos, {catalogo.libres()} disponibles")
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Bot de resumenes de libros para Mastodon")
+  sub = parser.add_subparsers(dest="comando")
+
+  p = sub.add_parser("run", help="publicar cada `intervalo` segundos (por defecto)")
+  p.add_argument("--validar", action="store_true", help="comprobar credenciales al arrancar")
+  p.set_defaults(funcion=run)
+
+  p = sub.add_parser("post-once", help="publicar un libro ahora y su respuesta")
+  p.add_argument("--validar", action="store_true", help="comprobar credenciales al arrancar")
+  p.set_defaults(funcion=postOnce)
+
+  p = sub.add_parser("dry-run", help="mostrar el proximo libro y su resumen sin publicar")
+  p.add_argument("--sin-resumen", action="store_true", help="no pedir el resumen")
+  p.set_defaults(funcion=dryRun)
+
+  p = sub.add_parser("import-catalog", help="importar una lista de libros y usados.txt al catalogo")
+  p.add_argument("lista", nargs="?", default="lista.txt")
+  p.add_argument("usados", nargs="?", default="usados.txt")
+  p.add_argument("--catalogo", default="catalogo.db")
+  p.set_defaults(funcion=importCatalog)
+
+  logging.basicConfig(level=os.environ.get("log_nivel", "INFO"), format="%(message)s")
+  args = parser.parse_args(argv)
+  if args.comando is None:
+    args = parser.parse_args(["run"])
+  args.funcion(args)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,185 @@
+import argparse, asyncio, json, os, re, time
+
+from metricas import etapa
+from resumenes import getOpenAI, getPrompt
+
+# Resumen masivo del catalogo: varios libros por peticion, varias peticiones
+# en paralelo limitadas por peticiones/minuto y tokens/minuto, y cada resumen
+# se escribe en cuanto llega a un JSONL, que sirve tambien para reanudar.
+
+
+def getPromptLote(libros):
+  lista = "\n".join(f"{n}. {libro}" for n, libro in enumerate(libros, 1))
+  return ("sumarice each of these books in 50 words in spanish. Sin decir el titulo "
+          "ni el autor. Responde solo con un objeto JSON cuyas claves sean los "
+          f"numeros de la lista y cuyos valores sean los resumenes.\n{lista}")
+
+
+def leerLote(texto, libros):
+  # Devuelve {libro: resumen} con los libros que se pudieron leer de la
+  # respuesta; primero como JSON y si no, como lineas "n. resumen".
+  resumenes = {}
+  inicio, fin = texto.find("{"), texto.rfind("}")
+  try:
+    datos = json.loads(texto[inicio:fin + 1]) if inicio != -1 else {}
+  except ValueError:
+    datos = {}
+  if not isinstance(datos, dict) or not datos:
+    datos = dict(re.findall(r"^\s*(\d+)[.):-]\s*(.+)$", texto, re.MULTILINE))
+  for clave, resumen in datos.items():
+    try:
+      n = int(clave)
+    except ValueError:
+      continue
+    if 1 <= n <= len(libros) and isinstance(resumen, str) and resumen.strip():
+      resumenes[libros[n - 1]] = resumen.strip().capitalize()
+  return resumenes
+
+
+class LimiteTokens:
+  # Dos cubos de fichas que se rellenan de forma continua: uno de peticiones
+  # por minuto y otro de tokens por minuto.
+  def __init__(self, rpm, tpm, reloj=time.monotonic):
+    self.reloj = reloj
+    self.cubos = [[float(rpm), float(rpm), rpm / 60.0], [float(tpm), float(tpm), tpm / 60.0]]
+    self._ultimo = reloj()
+    self._cerrojo = asyncio.Lock()
+
+  def _rellenar(self):
+    ahora = self.reloj()
+    for cubo in self.cubos:
+      cubo[1] = min(cubo[0], cubo[1] + (ahora - self._ultimo) * cubo[2])
+    self._ultimo = ahora
+
+  async def adquirir(self, tokens):
+    async with self._cerrojo:
+      costes = [min(1, self.cubos[0][0]), min(tokens, self.cubos[1][0])]
+      while True:
+        self._rellenar()
+        espera = max((coste - cubo[1]) / cubo[2] for coste, cubo in zip(costes, self.cubos))
+        if espera <= 0:
+          for coste, cubo in zip(costes, self.cubos):
+            cubo[1] -= coste
+          return
+        await asyncio.sleep(espera)
+
+
+class ResumenMasivo:
+  def __init__(self, resumidor, salida="resumenes.jsonl", lote=10, concurrencia=4,
+               rpm=60, tpm=90000, tokens_por_libro=120):
+    self.resumidor = resumidor
+    self.salida = salida
+    self.lote = lote
+    self.concurrencia = concurrencia
+    self.limite = LimiteTokens(rpm, tpm)
+    self.tokens_por_libro = tokens_por_libro
+    self.hechos = 0
+
+  def _terminados(self):
+    terminados = {}
+    if os.path.exists(self.salida):
+      with open(self.salida, "r") as f:
+        for linea in f:
+          try:
+            entrada = json.loads(linea)
+            terminados[entrada["libro"]] = entrada["resumen"]
+          except (ValueError, KeyError):
+            # Ultima linea a medio escribir si el proceso murio.
+            continue
+    return terminados
+
+  def _pendientes(self, libros):
+    terminados = self._terminados()
+    # Lo que ya esta en el JSONL se vuelve a dejar fijo en la cache, por si
+    # se borro o se expulso de ella (caches anteriores no tenian entradas
+    # fijas), para no tener que pedirlo otra vez al publicar.
+    self.resumidor.cache.fijar(
+      (self.resumidor.clave(libro), libro, resumen) for libro, resumen in terminados.items())
+    lote = []
+    for libro in libros:
+      if libro in terminados or self.resumidor.enCache(libro) is not None:
+        continue
+      lote.append(libro)
+      if len(lote) == self.lote:
+        yield lote
+        lote = []
+    if lote:
+      yield lote
+
+  async def _completar(self, prompt, max_tokens):
+    await self.limite.adquirir(len(prompt) // 4 + max_tokens)
+    with etapa("openai", modelo=self.resumidor.modelo, modo="masivo") as medida:
+      request = await getOpenAI().Completion.acreate(
+        model=self.resumidor.modelo, prompt=prompt, max_tokens=max_tokens,
+        temperature=self.resumidor.temperatura)
+      texto = request["choices"][0]["text"]
+      medida.bytes = len(texto.encode("utf-8"))
+    return texto
+
+  async def _resumirLote(self, libros):
+    if len(libros) == 1:
+      texto = await self._completar(getPrompt(libros[0]), self.resumidor.max_tokens)
+      resumenes = {libros[0]: texto.strip().capitalize()}
+    else:
+      texto = await self._completar(getPromptLote(libros),
+                                    self.tokens_por_libro * len(libros))
+      resumenes = leerLote(texto, libros)
+      # Los que no vinieron en la respuesta se piden uno a uno.
+      for libro in libros:
+        if libro not in resumenes:
+          texto = await self._completar(getPrompt(libro), self.resumidor.max_tokens)
+          resumenes[libro] = texto.strip().capitalize()
+    return resumenes
+
+  def _guardar(self, f, resumenes):
+    self.resumidor.cache.fijar(
+      (self.resumidor.clave(libro), libro, resumen) for libro, resumen in resumenes.items())
+    for libro, resumen in resumenes.items():
+      f.write(json.dumps({"libro": libro, "resumen": resumen}, ensure_ascii=False) + "\n")
+    f.flush()
+    self.hechos += len(resumenes)
+
+  async def ejecutar(self, libros):
+    lotes = self._pendientes(libros)
+    with open(self.salida, "a+b") as f:
+      # Si el proceso murio a mitad de una linea, se empieza en una nueva.
+      if f.seek(0, os.SEEK_END):
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+          f.write(b"\n")
+    with open(self.salida, "a") as f:
+      async def trabajador():
+        for lote in lotes:
+          try:
+            self._guardar(f, await self._resumirLote(lote))
+          except getOpenAI().error.OpenAIError as e:
+            print(f"Error resumiendo {lote}: {e}")
+      await asyncio.gather(*(trabajador() for _ in range(self.concurrencia)))
+    return self.hechos
+
+
+def main():
+  from catalogo import Catalogo
+  from resumenes import CacheResumenes, Resumidor
+
+  parser = argparse.ArgumentParser(description="Resume por adelantado todo el catalogo")
+  parser.add_argument("--catalogo", default="catalogo.db")
+  parser.add_argument("--cache", default="resumenes.db")
+  parser.add_argument("--salida", default="resumenes.jsonl")
+  parser.add_argument("--lote", type=int, default=10, help="libros por peticion")
+  parser.add_argument("--concurrencia", type=int, default=4)
+  parser.add_argument("--rpm", type=int, default=60, help="peticiones por minuto")
+  parser.add_argument("--tpm", type=int, default=90000, help="tokens por minuto")
+  parser.add_argument("--todos", action="store_true", help="incluir libros ya usados")
+  args = parser.parse_args()
+
+  cache = CacheResumenes(args.cache, int(os.environ.get("cache_max_entradas", 10000)))
+  masivo = ResumenMasivo(Resumidor(cache),
+                         args.salida, args.lote, args.concurrencia, args.rpm, args.tpm)
+  inicio = time.perf_counter()
+  hechos = asyncio.run(masivo.ejecutar(Catalogo(args.catalogo).recorrer(not args.todos)))
+  print(f"{hechos} resumenes en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+  main()
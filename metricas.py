@@ -0,0 +1,129 @@
+import contextlib, json, logging, os, threading, time
+
+# Metricas por etapa del ciclo (eleccion, resumen, toot, respuesta): cada
+# etapa registra duracion, bytes y resultado. Se emiten como logs JSON y se
+# acumulan para exportarlas en formato de texto de Prometheus, en un archivo
+# o en un endpoint HTTP local.
+
+log = logging.getLogger("bot.metricas")
+
+CUBETAS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_cerrojo = threading.Lock()
+_series = {}
+
+
+class Etapa:
+  def __init__(self, nombre, etiquetas):
+    self.nombre = nombre
+    self.etiquetas = etiquetas
+    self.bytes = 0
+    self.resultado = "ok"
+
+
+@contextlib.contextmanager
+def etapa(nombre, **etiquetas):
+  medida = Etapa(nombre, etiquetas)
+  inicio = time.perf_counter()
+  try:
+    yield medida
+  except BaseException as e:
+    medida.resultado = f"error:{type(e).__name__}"
+    raise
+  finally:
+    registrar(medida, time.perf_counter() - inicio)
+
+
+def registrar(medida, segundos):
+  etiquetas = dict(medida.etiquetas, etapa=medida.nombre, resultado=medida.resultado)
+  clave = tuple(sorted(etiquetas.items()))
+  with _cerrojo:
+    serie = _series.get(clave)
+    if serie is None:
+      serie = _series[clave] = {"cuenta": 0, "suma": 0.0, "bytes": 0,
+                                "cubetas": [0] * len(CUBETAS)}
+    serie["cuenta"] += 1
+    serie["suma"] += segundos
+    serie["bytes"] += medida.bytes
+    for i, limite in enumerate(CUBETAS):
+      if segundos <= limite:
+        serie["cubetas"][i] += 1
+  log.info(json.dumps(dict(etiquetas, segundos=round(segundos, 6), bytes=medida.bytes),
+                      ensure_ascii=False))
+
+
+def resumen():
+  # {etapa: (cuenta, segundos, bytes)} sumando todas las etiquetas.
+  total = {}
+  with _cerrojo:
+    for clave, serie in _series.items():
+      nombre = dict(clave)["etapa"]
+      cuenta, suma, bytes_ = total.get(nombre, (0, 0.0, 0))
+      total[nombre] = (cuenta + serie["cuenta"], suma + serie["suma"], bytes_ + serie["bytes"])
+  return total
+
+
+def reiniciar():
+  with _cerrojo:
+    _series.clear()
+
+
+def _etiquetas(clave, extra=()):
+  pares = list(clave) + list(extra)
+  valor = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+  return "{" + ",".join(f'{k}="{valor(v)}"' for k, v in pares) + "}"
+
+
+def exportar():
+  lineas = [
+    "# HELP bot_etapa_segundos Duracion de cada etapa del ciclo.",
+    "# TYPE bot_etapa_segundos histogram",
+  ]
+  with _cerrojo:
+    series = [(clave, dict(serie, cubetas=list(serie["cubetas"])))
+              for clave, serie in sorted(_series.items())]
+  for clave, serie in series:
+    for limite, cuenta in zip(CUBETAS, serie["cubetas"]):
+      lineas.append(f"bot_etapa_segundos_bucket{_etiquetas(clave, [('le', limite)])} {cuenta}")
+    lineas.append(f"bot_etapa_segundos_bucket{_etiquetas(clave, [('le', '+Inf')])} {serie['cuenta']}")
+    lineas.append(f"bot_etapa_segundos_sum{_etiquetas(clave)} {serie['suma']}")
+    lineas.append(f"bot_etapa_segundos_count{_etiquetas(clave)} {serie['cuenta']}")
+  lineas += ["# HELP bot_etapa_bytes_total Bytes procesados por cada etapa.",
+             "# TYPE bot_etapa_bytes_total counter"]
+  for clave, serie in series:
+    lineas.append(f"bot_etapa_bytes_total{_etiquetas(clave)} {serie['bytes']}")
+  return "\n".join(lineas) + "\n"
+
+
+def escribir(ruta):
+  # Escritura atomica, para el textfile collector de node_exporter.
+  temporal = f"{ruta}.tmp"
+  with open(temporal, "w") as f:
+    f.write(exportar())
+  os.replace(temporal, ruta)
+
+
+def servir(puerto, host="127.0.0.1"):
+  # http.server solo se importa si se pide el endpoint, para no alargar el
+  # arranque.
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+  class Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+      if self.path != "/metrics":
+        self.send_error(404)
+        return
+      salida = exportar().encode("utf-8")
+      self.send_response(200)
+      self.send_header("Content-Type", "text/plain; version=0.0.4")
+      self.send_header("Content-Length", str(len(salida)))
+      self.end_headers()
+      self.wfile.write(salida)
+
+    def log_message(self, *args):
+      pass
+
+  servidor = ThreadingHTTPServer((host, puerto), Manejador)
+  servidor.daemon_threads = True
+  threading.Thread(target=servidor.serve_forever, daemon=True).start()
+  return servidor
@@ -0,0 +1,89 @@
+import asyncio, heapq, itertools, time
+
+# Planificador sobre asyncio. Los trabajos se guardan en un monticulo por
+# hora de ejecucion y el bucle duerme hasta el siguiente, o hasta que se
+# programe uno antes. Cada ejecucion es una tarea independiente, asi que
+# pueden convivir varias publicaciones y respuestas pendientes a la vez.
+
+
+class Reloj:
+  def time(self):
+    return time.monotonic()
+
+  async def esperar(self, evento, segundos):
+    try:
+      await asyncio.wait_for(evento.wait(), segundos)
+    except asyncio.TimeoutError:
+      pass
+
+
+class RelojFalso:
+  # Reloj para pruebas: esperar() deja correr a las tareas listas y luego
+  # avanza el tiempo al instante, sin dormir.
+  def __init__(self, inicio=0.0):
+    self.ahora = inicio
+
+  def time(self):
+    return self.ahora
+
+  async def esperar(self, evento, segundos):
+    await asyncio.sleep(0)
+    if not evento.is_set():
+      self.ahora += segundos
+
+
+class Planificador:
+  def __init__(self, reloj=None):
+    self.reloj = reloj or Reloj()
+    self._eventos = []
+    self._orden = itertools.count()
+    self._tareas = set()
+    self._cambio = None
+
+  def en(self, retraso, funcion, *args):
+    self._programar(self.reloj.time() + retraso, None, funcion, args)
+
+  def cada(self, intervalo, funcion, *args):
+    self._programar(self.reloj.time() + intervalo, intervalo, funcion, args)
+
+  def _programar(self, cuando, intervalo, funcion, args):
+    heapq.heappush(self._eventos,
+                   (cuando, next(self._orden), intervalo, funcion, args))
+    if self._cambio is not None:
+      self._cambio.set()
+
+  def pendientes(self):
+    return len(self._eventos) + len(self._tareas)
+
+  async def ejecutar(self, hasta=None):
+    self._cambio = asyncio.Event()
+    while self._eventos or self._tareas:
+      ahora = self.reloj.time()
+      while self._eventos and self._eventos[0][0] <= ahora:
+        cuando, _, intervalo, funcion, args = heapq.heappop(self._eventos)
+        if intervalo is not None:
+          self._programar(cuando + intervalo, intervalo, funcion, args)
+        self._lanzar(funcion, args)
+      if hasta is not None and ahora >= hasta:
+        break
+      self._cambio.clear()
+      if self._eventos:
+        espera = self._eventos[0][0] - ahora
+        if hasta is not None:
+          espera = min(espera, hasta - ahora)
+        await self.reloj.esperar(self._cambio, espera)
+      else:
+        # Solo quedan tareas en curso; pueden programar nuevos eventos.
+        await self._cambio.wait()
+
+  def _lanzar(self, funcion, args):
+    tarea = asyncio.ensure_future(funcion(*args))
+    self._tareas.add(tarea)
+    tarea.add_done_callback(self._terminada)
+
+  def _terminada(self, tarea):
+    self._tareas.discard(tarea)
+    if not tarea.cancelled() and tarea.exception() is not None:
+      print(f"Error en tarea programada: {tarea.exception()!r}")
+    if self._cambio is not None:
+      self._cambio.set()
@@ -0,0 +1,188 @@
+import hashlib, os, sqlite3, threading, time
+from metricas import etapa
+
+# Resumenes generados con OpenAI, guardados en una cache en disco para no
+# pedir nunca dos veces el mismo prompt, y un hilo que deja resumidos por
+# adelantado los proximos libros de la cola del catalogo.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resumenes (
+  clave TEXT PRIMARY KEY,
+  libro TEXT NOT NULL,
+  resumen TEXT NOT NULL,
+  creado REAL NOT NULL,
+  usado REAL NOT NULL,
+  fijo INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS resumenes_usado ON resumenes(usado);
+CREATE INDEX IF NOT EXISTS resumenes_creado ON resumenes(creado);
+CREATE INDEX IF NOT EXISTS resumenes_expulsables ON resumenes(usado) WHERE NOT fijo;
+"""
+
+
+_openai = None
+
+def getOpenAI():
+  # openai se importa y configura la primera vez que hace falta.
+  global _openai
+  if _openai is None:
+    import openai
+    openai.organization = os.environ.get("org_id", openai.organization)
+    openai.api_key = os.environ.get("openAiSecret", openai.api_key)
+    _openai = openai
+  return _openai
+
+
+def getPrompt(libro):
+  return f"sumarice {libro} in 50 words in spanish. Sin decir el titulo ni el autor"
+
+
+class CacheResumenes:
+  # Cache clave-valor en SQLite. Se expulsan las entradas con mas de
+  # max_edad segundos y, si hay mas de max_entradas, las menos usadas. Las
+  # entradas fijas (las del resumen masivo, que se paga por adelantado) no
+  # se expulsan nunca ni cuentan para max_entradas.
+  def __init__(self, ruta="resumenes.db", max_entradas=10000, max_edad=None):
+    self.ruta = ruta
+    self.max_entradas = max_entradas
+    self.max_edad = max_edad
+    self._local = threading.local()
+
+  def _conexion(self):
+    con = getattr(self._local, "con", None)
+    if con is None:
+      con = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+      con.execute("PRAGMA journal_mode=WAL")
+      con.execute("PRAGMA synchronous=NORMAL")
+      columnas = [fila[1] for fila in con.execute("PRAGMA table_info(resumenes)")]
+      if columnas and "fijo" not in columnas:
+        con.execute("ALTER TABLE resumenes ADD COLUMN fijo INTEGER NOT NULL DEFAULT 0")
+      con.executescript(ESQUEMA)
+      self._local.con = con
+    return con
+
+  @staticmethod
+  def clave(libro, prompt, modelo, temperatura):
+    texto = "\0".join((libro, prompt, modelo, repr(float(temperatura))))
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+  def get(self, clave):
+    con = self._conexion()
+    fila = con.execute("SELECT resumen, creado, fijo FROM resumenes WHERE clave = ?",
+                       (clave, )).fetchone()
+    if fila is None:
+      return None
+    ahora = time.time()
+    if self.max_edad is not None and not fila[2] and fila[1] < ahora - self.max_edad:
+      con.execute("DELETE FROM resumenes WHERE clave = ?", (clave, ))
+      return None
+    con.execute("UPDATE resumenes SET usado = ? WHERE clave = ?", (ahora, clave))
+    return fila[0]
+
+  def put(self, clave, libro, resumen):
+    con = self._conexion()
+    ahora = time.time()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+      con.execute("INSERT OR REPLACE INTO resumenes VALUES (?, ?, ?, ?, ?, 0)",
+                  (clave, libro, resumen, ahora, ahora))
+      self._expulsar(con, ahora)
+      con.execute("COMMIT")
+    except BaseException:
+      con.execute("ROLLBACK")
+      raise
+
+  def fijar(self, entradas):
+    # Guarda como fijas las entradas (clave, libro, resumen); las que ya
+    # estaban se conservan y pasan a ser fijas.
+    con = self._conexion()
+    ahora = time.time()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+      con.executemany(
+        "INSERT INTO resumenes VALUES (?, ?, ?, ?, ?, 1) "
+        "ON CONFLICT(clave) DO UPDATE SET fijo = 1",
+        ((clave, libro, resumen, ahora, ahora) for clave, libro, resumen in entradas))
+      con.execute("COMMIT")
+    except BaseException:
+      con.execute("ROLLBACK")
+      raise
+
+  def _expulsar(self, con, ahora):
+    if self.max_edad is not None:
+      con.execute("DELETE FROM resumenes WHERE creado < ? AND NOT fijo",
+                  (ahora - self.max_edad, ))
+    if self.max_entradas is not None:
+      total = con.execute("SELECT count(*) FROM resumenes WHERE NOT fijo").fetchone()[0]
+      if total > self.max_entradas:
+        con.execute(
+          "DELETE FROM resumenes WHERE clave IN "
+          "(SELECT clave FROM resumenes WHERE NOT fijo ORDER BY usado LIMIT ?)",
+          (total - self.max_entradas, ))
+
+
+class Resumidor:
+  def __init__(self, cache, modelo="text-davinci-003", temperatura=1, max_tokens=200):
+    self.cache = cache
+    self.modelo = modelo
+    self.temperatura = temperatura
+    self.max_tokens = max_tokens
+
+  def clave(self, libro):
+    return self.cache.clave(libro, getPrompt(libro), self.modelo, self.temperatura)
+
+  def enCache(self, libro):
+    return self.cache.get(self.clave(libro))
+
+  def resumen(self, libro):
+    clave = self.clave(libro)
+    resumen = self.cache.get(clave)
+    if resumen is None:
+      with etapa("openai", modelo=self.modelo) as medida:
+        request = getOpenAI().Completion.create(
+          model=self.modelo, prompt=getPrompt(libro), max_tokens=self.max_tokens,
+          temperature=self.temperatura)
+        resumen = request["choices"][0]["text"].strip().capitalize()
+        medida.bytes = len(resumen.encode("utf-8"))
+      self.cache.put(clave, libro, resumen)
+    return resumen
+
+
+class Pregenerador:
+  # Mantiene `cantidad` libros reservados en la cola del catalogo y con su
+  # resumen ya en la cache. Se despierta cada `espera` segundos o cuando
+  # se le avisa con despertar() despues de publicar.
+  def __init__(self, catalogo, resumidor, cantidad=3, espera=300):
+    self.catalogo = catalogo
+    self.resumidor = resumidor
+    self.cantidad = cantidad
+    self.espera = espera
+    self._evento = threading.Event()
+    self._hilo = None
+
+  def rellenar(self):
+    proximos = self.catalogo.proximos()
+    while len(proximos) < self.cantidad:
+      try:
+        proximos.append(self.catalogo.reservar())
+      except LookupError:
+        break
+    for libro in proximos:
+      self.resumidor.resumen(libro)
+
+  def despertar(self):
+    self._evento.set()
+
+  def iniciar(self):
+    if self._hilo is None:
+      self._hilo = threading.Thread(target=self._bucle, daemon=True)
+      self._hilo.start()
+
+  def _bucle(self):
+    while True:
+      try:
+        self.rellenar()
+      except Exception as e:
+        print(f"Error pregenerando resumenes: {e}")
+      self._evento.wait(self.espera)
+      self._evento.clear()
@@ -0,0 +1,236 @@
+import collections, json, random, re
+from ingesta import clave
+
+# Selector de libros en memoria con cubetas por autor y por genero. Elegir un
+# libro cuesta O(1) esperado: se sortea un autor activo (muestreo por rechazo
+# para respetar los pesos y no repetir los ultimos autores) y despues un libro
+# de su cubeta. Los libros elegidos o usados se quitan intercambiandolos con
+# el ultimo de su lista, sin reconstruir nada. De cada serie solo se ofrece
+# el primer volumen que queda libre, asi que se publican en orden.
+
+_ROMANOS = {r: n for n, r in enumerate(
+  "I II III IV V VI VII VIII IX X XI XII XIII XIV XV XVI XVII XVIII XIX XX".split(), 1)}
+_PARTES = re.compile(r"\s+[-–]\s+")
+_INTENTOS = 64
+
+
+def volumen(titulo):
+  # "La torre oscura III - Las tierras baldias" -> ("la torre oscura", 3);
+  # None si el titulo no acaba en un numero de volumen.
+  # Las partes se separan con guion o con raya, como en ingesta.separar.
+  partes = _PARTES.split(titulo)
+  for i, parte in enumerate(partes):
+    palabras = parte.split()
+    if len(palabras) < 2:
+      continue
+    numero = _numero(palabras[-1], parte)
+    if numero is not None:
+      return " ".join([clave(p) for p in partes[:i]] + [clave(" ".join(palabras[:-1]))]), numero
+  return None
+
+
+def _numero(palabra, parte):
+  # Del 1 al 20, en arabigos o en romanos en mayusculas: "Lo que vi" o
+  # "Catch 22" no son volumenes. En un titulo todo en mayusculas no se
+  # distingue "VI" de una palabra, asi que ahi solo valen los arabigos.
+  if palabra.isdigit():
+    return int(palabra) if 1 <= int(palabra) <= 20 else None
+  if parte.isupper():
+    return None
+  return _ROMANOS.get(palabra)
+
+
+class _Autor:
+  __slots__ = ("nombre", "genero", "peso", "libros", "posiciones", "indice", "indiceGenero")
+
+  def __init__(self, nombre, genero, peso):
+    self.nombre = nombre
+    self.genero = genero
+    self.peso = peso
+    # Libros que se pueden elegir ya: sueltos y el primer volumen libre de
+    # cada serie. posiciones[id] es su indice en `libros`.
+    self.libros = []
+    self.posiciones = {}
+    self.indice = None
+    self.indiceGenero = None
+
+
+class Selector:
+  # ventana: no repetir autor en las ultimas `ventana` elecciones.
+  # ventanaGenero: lo mismo para los generos.
+  # pesos: {autor: peso}, 1 por defecto. generos: {autor: genero}.
+  # series: listas de titulos en el orden en que se deben publicar, para las
+  # series que no se detectan solas por el numero de volumen.
+  def __init__(self, ventana=5, ventanaGenero=0, pesos=None, generos=None, series=(),
+               azar=None):
+    self.ventana = ventana
+    self.ventanaGenero = ventanaGenero
+    self.pesos = {clave(a): p for a, p in (pesos or {}).items()}
+    self.generos = {clave(a): g for a, g in (generos or {}).items()}
+    self.ordenSeries = {}
+    for n, titulos in enumerate(series):
+      for posicion, titulo in enumerate(titulos):
+        self.ordenSeries[clave(titulo)] = (f"#{n}", posicion)
+    self.azar = azar or random.Random()
+    self.pesoMaximo = max([1] + list(self.pesos.values()))
+    self._libros = {}
+    self._nombres = {}
+    self._autores = {}
+    self._series = {}
+    self._activos = []
+    self._porGenero = {}
+    self._recientes = collections.deque()
+    self._enVentana = collections.Counter()
+    self._generosRecientes = collections.deque()
+    self._generosEnVentana = collections.Counter()
+
+  @classmethod
+  def desdeArchivo(cls, ruta, **opciones):
+    # {"ventana": 5, "ventana_genero": 2, "pesos": {...}, "generos": {...},
+    #  "series": [[...], ...]}
+    with open(ruta, "r", encoding="utf-8") as f:
+      config = json.load(f)
+    return cls(ventana=config.get("ventana", 5), ventanaGenero=config.get("ventana_genero", 0),
+               pesos=config.get("pesos"), generos=config.get("generos"),
+               series=config.get("series", ()), **opciones)
+
+  def __len__(self):
+    return len(self._libros)
+
+  def agregar(self, id, libro, autor=""):
+    if id in self._libros:
+      return
+    titulo = libro[:-len(autor) - 3] if autor and libro.endswith(f" - {autor}") else libro
+    # Los libros sin autor no comparten cubeta entre si.
+    nombre = self._nombres.get(autor)
+    if nombre is None:
+      nombre = self._nombres[autor] = clave(autor)
+    nombre = nombre or f"#{id}"
+    orden = self.ordenSeries.get(clave(titulo)) if self.ordenSeries else None
+    if orden is None:
+      orden = volumen(titulo)
+      if orden is not None:
+        orden = (f"{nombre}|{orden[0]}", orden[1])
+    self._libros[id] = (nombre, orden)
+    a = self._autores.get(nombre)
+    if a is None:
+      a = self._autores[nombre] = _Autor(nombre, self.generos.get(nombre, ""),
+                                         self.pesos.get(nombre, 1))
+    if orden is None:
+      self._meter(a, id)
+      return
+    serie = self._series.setdefault(orden[0], [])
+    if serie and orden[1] < self._libros[serie[0]][1][1]:
+      # Llega un volumen anterior al que se ofrecia: pasa a ser el primero.
+      # Las series de selector.json pueden tener varios autores, asi que el
+      # anterior se saca de la cubeta de su propio autor.
+      self._sacar(self._autorDe(serie[0]), serie[0])
+      self._meter(a, id)
+    elif not serie:
+      self._meter(a, id)
+    serie.append(id)
+    serie.sort(key=lambda i: self._libros[i][1][1])
+
+  def quitar(self, id):
+    # Para libros marcados como usados por fuera del selector.
+    entrada = self._libros.pop(id, None)
+    if entrada is None:
+      return
+    nombre, orden = entrada
+    a = self._autores[nombre]
+    if orden is None:
+      self._sacar(a, id)
+      return
+    serie = self._series[orden[0]]
+    if serie[0] == id:
+      self._sacar(a, id)
+      serie.pop(0)
+      if serie:
+        self._meter(self._autorDe(serie[0]), serie[0])
+    else:
+      serie.remove(id)
+    if not serie:
+      del self._series[orden[0]]
+
+  def _autorDe(self, id):
+    return self._autores[self._libros[id][0]]
+
+  def elegir(self, genero=None):
+    # Devuelve el id elegido y lo quita del selector.
+    candidatos = self._activos if genero is None else self._porGenero.get(genero, [])
+    if not candidatos:
+      raise LookupError("No quedan libros sin usar en el selector")
+    a = self._sortear(candidatos)
+    id = a.libros[self.azar.randrange(len(a.libros))]
+    self.quitar(id)
+    self._recordar(a.nombre)
+    return id
+
+  def recordar(self, autor):
+    # Anota una eleccion hecha fuera del selector (por ejemplo, los libros
+    # que ya estaban en la cola al arrancar) en la ventana de recientes.
+    if autor:
+      self._recordar(clave(autor))
+
+  def _recordar(self, nombre):
+    genero = self.generos.get(nombre, "")
+    self._recientes.append(nombre)
+    self._enVentana[nombre] += 1
+    if len(self._recientes) > self.ventana:
+      self._olvidar(self._recientes, self._enVentana)
+    if genero:
+      self._generosRecientes.append(genero)
+      self._generosEnVentana[genero] += 1
+    if len(self._generosRecientes) > self.ventanaGenero:
+      self._olvidar(self._generosRecientes, self._generosEnVentana)
+
+  def _sortear(self, candidatos):
+    for _ in range(_INTENTOS):
+      a = candidatos[self.azar.randrange(len(candidatos))]
+      if self._admisible(a) and self.azar.random() * self.pesoMaximo < a.peso:
+        return a
+    # Casi todos los autores estan en la ventana: se recorre la lista una
+    # vez, y si ninguno cumple las restricciones se relajan.
+    admisibles = [a for a in candidatos if self._admisible(a) and a.peso > 0]
+    if not admisibles:
+      admisibles = [a for a in candidatos if a.nombre not in self._enVentana] or candidatos
+    return self.azar.choices(admisibles, [max(a.peso, 1e-9) for a in admisibles])[0]
+
+  def _admisible(self, a):
+    return a.nombre not in self._enVentana and not (a.genero and a.genero in self._generosEnVentana)
+
+  def _meter(self, a, id):
+    a.posiciones[id] = len(a.libros)
+    a.libros.append(id)
+    if a.indice is None:
+      a.indice = len(self._activos)
+      self._activos.append(a)
+      lista = self._porGenero.setdefault(a.genero, [])
+      a.indiceGenero = len(lista)
+      lista.append(a)
+
+  def _sacar(self, a, id):
+    i = a.posiciones.pop(id)
+    ultimo = a.libros.pop()
+    if ultimo != id:
+      a.libros[i] = ultimo
+      a.posiciones[ultimo] = i
+    if not a.libros:
+      _quitarDeLista(self._activos, a, "indice")
+      _quitarDeLista(self._porGenero[a.genero], a, "indiceGenero")
+
+  @staticmethod
+  def _olvidar(recientes, enVentana):
+    viejo = recientes.popleft()
+    enVentana[viejo] -= 1
+    if not enVentana[viejo]:
+      del enVentana[viejo]
+
+
+def _quitarDeLista(lista, a, atributo):
+  i = getattr(a, atributo)
+  ultimo = lista.pop()
+  if ultimo is not a:
+    lista[i] = ultimo
+    setattr(ultimo, atributo, i)
+  setattr(a, atributo, None)
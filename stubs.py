@@ -0,0 +1,139 @@
+import itertools, json, re, threading, time, urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Servidores HTTP locales que imitan lo minimo de las APIs que usa el bot,
+# para pruebas y benchmarks sin red.
+
+
+class _Servidor(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, manejador, latencia=0.0):
+    super().__init__(("127.0.0.1", 0), manejador)
+    self.latencia = latencia
+    self.peticiones = []
+    self._cerrojo = threading.Lock()
+
+  @property
+  def url(self):
+    return f"http://127.0.0.1:{self.server_port}"
+
+  def registrar(self, ruta, cuerpo):
+    with self._cerrojo:
+      self.peticiones.append((ruta, cuerpo))
+
+  def iniciar(self):
+    threading.Thread(target=self.serve_forever, daemon=True).start()
+    return self
+
+  def parar(self):
+    self.shutdown()
+    self.server_close()
+
+
+class _Manejador(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  disable_nagle_algorithm = True
+
+  def log_message(self, *args):
+    pass
+
+  def _leer(self):
+    largo = int(self.headers.get("Content-Length") or 0)
+    cuerpo = self.rfile.read(largo) if largo else b""
+    tipo = self.headers.get("Content-Type", "")
+    if tipo.startswith("application/json") and cuerpo:
+      return json.loads(cuerpo)
+    if tipo.startswith("application/x-www-form-urlencoded"):
+      return dict(urllib.parse.parse_qsl(cuerpo.decode("utf-8")))
+    return cuerpo.decode("utf-8", "replace")
+
+  def _responder(self, datos, codigo=200, cabeceras=None):
+    salida = json.dumps(datos).encode("utf-8")
+    self.send_response(codigo)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(salida)))
+    for clave, valor in (cabeceras or {}).items():
+      self.send_header(clave, valor)
+    self.end_headers()
+    self.wfile.write(salida)
+
+
+class _ManejadorMastodon(_Manejador):
+  ids = itertools.count(1)
+
+  def do_POST(self):
+    cuerpo = self._leer()
+    self.server.registrar(self.path, cuerpo)
+    if self.server.latencia:
+      time.sleep(self.server.latencia)
+    if not self.path.startswith("/api/v1/statuses"):
+      return self._responder({"error": "Not found"}, 404)
+    respuestaA = cuerpo.get("in_reply_to_id")
+    if respuestaA and self.server.fallarRespuestas:
+      return self._responder({"error": "fallo falso"}, 500)
+    # Como Mastodon, una Idempotency-Key repetida por la misma cuenta
+    # devuelve el toot ya creado en lugar de publicar otro.
+    cuenta = self.headers.get("Authorization", "")
+    clave = self.headers.get("Idempotency-Key")
+    with self.server.cerrojoToots:
+      toot = self.server.idempotentes.get((cuenta, clave)) if clave else None
+      if toot is None:
+        toot = {"id": str(next(self.ids)), "cuenta": cuenta, "texto": cuerpo.get("status", ""),
+                "respuestaA": respuestaA}
+        self.server.toots.append(toot)
+        if clave:
+          self.server.idempotentes[(cuenta, clave)] = toot
+    self._responder({"id": toot["id"], "content": toot["texto"], "visibility": "public",
+                     "in_reply_to_id": respuestaA})
+
+  def do_GET(self):
+    self.server.registrar(self.path, None)
+    if self.path.startswith("/api/v1/instance"):
+      self._responder({"uri": "localhost", "title": "stub", "version": "4.2.0"})
+    elif self.path.startswith("/api/v1/accounts/verify_credentials"):
+      self._responder({"id": "1", "username": "bot", "acct": "bot"})
+    else:
+      self._responder({"error": "Not found"}, 404)
+
+
+class _ManejadorOpenAI(_Manejador):
+  # Completions: si el prompt es una lista numerada de libros responde con un
+  # objeto JSON {numero: resumen}, como pide masivo.py.
+  def do_POST(self):
+    cuerpo = self._leer()
+    self.server.registrar(self.path, cuerpo)
+    if self.server.latencia:
+      time.sleep(self.server.latencia)
+    if not self.path.endswith("/completions"):
+      return self._responder({"error": {"message": "Not found"}}, 404)
+    numeros = re.findall(r"^(\d+)\. ", cuerpo.get("prompt", ""), re.MULTILINE)
+    if numeros:
+      texto = json.dumps({n: f"resumen falso del libro {n}" for n in numeros})
+    else:
+      texto = f" resumen falso de {cuerpo.get('prompt', '')}"
+    self._responder({
+      "id": "cmpl-falso", "object": "text_completion", "model": cuerpo.get("model"),
+      "choices": [{"text": texto, "index": 0, "finish_reason": "stop"}],
+      "usage": {"prompt_tokens": len(cuerpo.get("prompt", "")) // 4,
+                "completion_tokens": len(texto) // 4}})
+
+  def do_GET(self):
+    self.server.registrar(self.path, None)
+    self._responder({"object": "list", "data": [{"id": "text-davinci-003", "object": "model"}]})
+
+
+def openaiFalso(latencia=0.0):
+  return _Servidor(_ManejadorOpenAI, latencia).iniciar()
+
+
+def mastodonFalso(latencia=0.0):
+  # servidor.toots guarda los toots creados, con la cuenta (la cabecera
+  # Authorization) y a que toot responden. Con fallarRespuestas las
+  # respuestas devuelven un error 500.
+  servidor = _Servidor(_ManejadorMastodon, latencia)
+  servidor.toots = []
+  servidor.idempotentes = {}
+  servidor.cerrojoToots = threading.Lock()
+  servidor.fallarRespuestas = False
+  return servidor.iniciar()
@@ -0,0 +1,45 @@
+from catalogo import Catalogo
+from selector import Selector
+
+
+def autor(libro):
+  return libro.rsplit(" - ", 1)[1]
+
+
+def test_la_ventana_de_autores_sobrevive_a_los_reinicios(tmp_path):
+  ruta = str(tmp_path / "catalogo.db")
+  Catalogo(ruta).agregar(f"Libro {n} - Autor {n % 3}" for n in range(30))
+  publicados = []
+  for _ in range(10):
+    # Un proceso nuevo en cada eleccion, como si se reiniciara el bot.
+    publicados.append(Catalogo(ruta, Selector(ventana=2)).elegir())
+  for i in range(2, len(publicados)):
+    assert autor(publicados[i]) not in {autor(p) for p in publicados[i - 2:i]}
+
+
+def test_no_elige_libros_marcados_por_otro_proceso(tmp_path):
+  ruta = str(tmp_path / "catalogo.db")
+  libros = [f"Libro {n} - Autor {n}" for n in range(10)]
+  catalogo = Catalogo(ruta, Selector(ventana=0))
+  catalogo.agregar(libros)
+  primero = catalogo.elegir()
+  # import-catalog en otro proceso, con el selector ya cargado.
+  Catalogo(ruta).marcarUsados(libros[:5])
+  despues = []
+  while True:
+    try:
+      despues.append(catalogo.elegir())
+    except LookupError:
+      break
+  assert sorted(despues) == sorted(set(libros[5:]) - {primero})
+
+
+def test_elige_libros_agregados_por_otro_proceso(tmp_path):
+  ruta = str(tmp_path / "catalogo.db")
+  catalogo = Catalogo(ruta, Selector(ventana=0))
+  catalogo.agregar(["Ficciones - Borges"])
+  assert catalogo.elegir() == "Ficciones - Borges"
+  # import-catalog en otro proceso, con el selector ya cargado.
+  Catalogo(ruta).agregar(["Rayuela - Cortázar", "El túnel - Sabato"])
+  assert sorted([catalogo.elegir(), catalogo.elegir()]) == ["El túnel - Sabato",
+                                                            "Rayuela - Cortázar"]
@@ -0,0 +1,28 @@
+from ingesta import Autores, Normalizador
+
+
+def test_unifica_erratas_en_apellidos_largos():
+  autores = Autores()
+  assert autores.canonico("Fedor Dostoiewski") == "Fedor Dostoiewski"
+  assert autores.canonico("Fedor Dostoieswski") == "Fedor Dostoiewski"
+  # Tal cual aparece en lista_raw.txt: dos letras cambiadas de orden.
+  assert autores.canonico("Fedor Dostoieswki") == "Fedor Dostoiewski"
+  assert autores.canonico("Juan Jacobo Rousseau") == "Juan Jacobo Rousseau"
+  assert autores.canonico("Juan Jacabo Rousseau") == "Juan Jacobo Rousseau"
+  assert autores.canonico("Juan Jacobo Rosseau") == "Juan Jacobo Rousseau"
+  assert autores.canonico("MarkTwain") == autores.canonico("Mark Twain")
+
+
+def test_no_unifica_nombres_distintos():
+  autores = Autores()
+  for nombre in ("Juan Pérez", "Juana Pérez", "José Martí", "José Martín",
+                 "Autor 12", "Autor 13"):
+    assert autores.canonico(nombre) == nombre
+
+
+def test_libros_de_autores_parecidos_no_se_descartan():
+  normalizador = Normalizador()
+  claves = {normalizador.registro(linea)[2]
+            for linea in ("1. Obras - Juan Pérez", "2. Obras - Juana Pérez",
+                          "3. Versos sencillos - José Martí", "4. Versos sencillos - José Martín")}
+  assert len(claves) == 4
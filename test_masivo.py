@@ -0,0 +1,96 @@
+import asyncio
+import openai
+import pytest
+import stubs
+from masivo import LimiteTokens, ResumenMasivo, leerLote
+from planificador import RelojFalso
+from resumenes import CacheResumenes, Resumidor, getPrompt
+
+
+@pytest.fixture(scope="module")
+def servidor():
+  servidor = stubs.openaiFalso()
+  base, clave = openai.api_base, openai.api_key
+  openai.api_base, openai.api_key = servidor.url + "/v1", "falsa"
+  yield servidor
+  openai.api_base, openai.api_key = base, clave
+  servidor.parar()
+
+
+LIBROS = ["Libro A - Autor A", "Libro B - Autor B", "Libro C - Autor C"]
+
+
+def test_lee_el_lote_como_json():
+  texto = ('Claro, aqui estan:\n{"1": "uno.", "3": "  tres.  ", "7": "fuera", "x": "no", '
+           '"2": ""}\nEspero que sirva.')
+  # El 2 viene vacio y el 7 y la "x" no son de la lista: el 2 se pedira aparte.
+  assert leerLote(texto, LIBROS) == {LIBROS[0]: "Uno.", LIBROS[2]: "Tres."}
+
+
+def test_lee_el_lote_como_lineas_numeradas():
+  texto = "1. uno.\n  2) dos.\nnota: 3 no vino\n4. fuera"
+  assert leerLote(texto, LIBROS) == {LIBROS[0]: "Uno.", LIBROS[1]: "Dos."}
+  # Un JSON roto tambien se lee por lineas.
+  assert leerLote('{"1": "uno.",\n3- tres.', LIBROS) == {LIBROS[2]: "Tres."}
+  assert leerLote("No se de que libros me hablas", LIBROS) == {}
+
+
+def test_limite_de_peticiones_y_tokens_por_minuto(monkeypatch):
+  reloj = RelojFalso()
+  esperas = []
+
+  async def dormir(segundos):
+    esperas.append(segundos)
+    reloj.ahora += segundos
+
+  monkeypatch.setattr(asyncio, "sleep", dormir)
+  limite = LimiteTokens(rpm=2, tpm=600, reloj=reloj.time)
+
+  async def adquirir(*tokens):
+    for t in tokens:
+      await limite.adquirir(t)
+
+  # Dos peticiones por minuto: la tercera espera a que vuelva una (30 s).
+  asyncio.run(adquirir(100, 100, 100))
+  assert esperas == [30]
+  # 600 tokens por minuto son 10 por segundo. Aqui manda el cubo de
+  # peticiones (30 s otra vez) y el de tokens se llena: quedan 600 - 500.
+  esperas.clear()
+  asyncio.run(adquirir(500))
+  assert esperas == [30]
+  # Una peticion mayor que el cubo espera solo a que este lleno: faltan 500
+  # tokens, 50 s.
+  esperas.clear()
+  asyncio.run(adquirir(5000))
+  assert esperas == [50]
+
+
+def test_el_resumen_masivo_no_se_expulsa_de_la_cache(tmp_path, servidor):
+  libros = [f"Libro {n} - Autor {n}" for n in range(30)]
+  resumidor = Resumidor(CacheResumenes(str(tmp_path / "resumenes.db"), max_entradas=5))
+  masivo = ResumenMasivo(resumidor, str(tmp_path / "resumenes.jsonl"), lote=1)
+  assert asyncio.run(masivo.ejecutar(libros)) == 30
+  # Lo que se resume al publicar sigue limitado por max_entradas.
+  for n in range(10):
+    resumidor.resumen(f"Otro {n}")
+  assert resumidor.enCache("Otro 0") is None
+
+  servidor.peticiones.clear()
+  for libro in libros:
+    assert resumidor.resumen(libro) == f"resumen falso de {getPrompt(libro)}".capitalize()
+  assert servidor.peticiones == []
+
+
+def test_se_recupera_en_la_cache_lo_que_ya_estaba_en_el_jsonl(tmp_path, servidor):
+  libros = [f"Libro {n} - Autor {n}" for n in range(5)]
+  salida = str(tmp_path / "resumenes.jsonl")
+  asyncio.run(ResumenMasivo(Resumidor(CacheResumenes(str(tmp_path / "vieja.db"))), salida,
+                            lote=1).ejecutar(libros))
+
+  # Una cache nueva (o una de la que se expulsaron) se rellena desde el JSONL.
+  servidor.peticiones.clear()
+  resumidor = Resumidor(CacheResumenes(str(tmp_path / "nueva.db")))
+  assert asyncio.run(ResumenMasivo(resumidor, salida).ejecutar(libros)) == 0
+  assert [resumidor.enCache(libro) for libro in libros] == \
+    [f"resumen falso de {getPrompt(libro)}".capitalize() for libro in libros]
+  assert servidor.peticiones == []
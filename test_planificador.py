@@ -0,0 +1,21 @@
+import asyncio
+from planificador import Planificador, RelojFalso
+
+
+def test_respuestas_a_los_900_segundos_sin_frenar_las_publicaciones():
+  reloj = RelojFalso()
+  planificador = Planificador(reloj)
+  publicaciones, respuestas = [], []
+
+  async def publicar():
+    publicaciones.append(reloj.time())
+    planificador.en(900, responder, reloj.time())
+
+  async def responder(publicado):
+    respuestas.append((publicado, reloj.time()))
+
+  planificador.cada(600, publicar)
+  asyncio.run(planificador.ejecutar(hasta=3000))
+
+  assert publicaciones == [600, 1200, 1800, 2400, 3000]
+  assert respuestas == [(600, 1500), (1200, 2100), (1800, 2700)]
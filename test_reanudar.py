@@ -0,0 +1,120 @@
+import collections, json, os, sqlite3, subprocess, sys, threading, time
+import pytest
+import stubs
+from bitacora import Bitacora
+
+# Se mata el proceso (os._exit, sin except ni finally) en cada paso del
+# ciclo, se vuelve a lanzar `post-once` y se comprueba que cada cuenta tiene
+# un toot por libro, una respuesta por toot y que no se ha perdido ningun
+# libro.
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# Se ejecuta en el proceso hijo: argv[1] es el punto en el que morir ("" para
+# no morir): justo antes o despues de anotar un paso en la bitacora, o
+# despues del primer toot o de la primera respuesta que llega.
+LANZADOR = """
+import os, sys
+sys.path.insert(0, sys.argv[2])
+import bitacora, cuentas, main
+punto = sys.argv[1]
+
+anotar = bitacora.Bitacora.anotar
+async def anotarYMorir(self, ciclo, paso, **datos):
+  if punto == f"antes-{paso}":
+    os._exit(9)
+  await anotar(self, ciclo, paso, **datos)
+  if paso == punto:
+    os._exit(9)
+bitacora.Bitacora.anotar = anotarYMorir
+
+llamar = cuentas.Instancia.llamar
+async def llamarYMorir(self, funcion, *args, **kwargs):
+  resultado = await llamar(self, funcion, *args, **kwargs)
+  if punto == ("respuesta" if "in_reply_to_id" in kwargs else "toot"):
+    os._exit(9)
+  return resultado
+cuentas.Instancia.llamar = llamarYMorir
+
+main.main(["post-once"])
+"""
+
+PUNTOS = ["antes-elegido", "elegido", "resumido", "toot", "publicado", "respuesta", "respondido"]
+
+
+@pytest.fixture(scope="module")
+def servidores():
+  openai, mastodon = stubs.openaiFalso(), stubs.mastodonFalso()
+  yield openai, mastodon
+  openai.parar()
+  mastodon.parar()
+
+
+@pytest.fixture
+def carpeta(tmp_path, servidores):
+  with open(tmp_path / "lista.txt", "w", encoding="utf-8") as f:
+    f.writelines(f"{n + 1}. Libro {n} - Autor {n}\n" for n in range(10))
+  with open(tmp_path / "cuentas.json", "w") as f:
+    json.dump({"cuentas": [{"nombre": nombre, "instancia": servidores[1].url, "token": nombre}
+                           for nombre in ("a", "b")]}, f)
+  servidores[1].toots.clear()
+  servidores[1].peticiones.clear()
+  servidores[1].fallarRespuestas = False
+  return tmp_path
+
+
+def lanzar(carpeta, servidores, punto="", **entorno):
+  entorno = dict(os.environ, OPENAI_API_BASE=servidores[0].url + "/v1", openAiSecret="falsa",
+                 retraso_respuesta="0", **entorno)
+  return subprocess.run([sys.executable, "-c", LANZADOR, punto, RAIZ], cwd=carpeta, env=entorno,
+                        capture_output=True, timeout=60)
+
+
+def comprobar(carpeta, mastodon):
+  toots = collections.defaultdict(list)
+  respuestas = collections.Counter()
+  for toot in mastodon.toots:
+    if toot["respuestaA"]:
+      respuestas[toot["respuestaA"], toot["cuenta"]] += 1
+    else:
+      toots[toot["cuenta"]].append(toot)
+  assert set(toots) == {"Bearer a", "Bearer b"}
+  publicados = [sorted(t["texto"] for t in lista) for lista in toots.values()]
+  # El mismo libro en las dos cuentas, y ninguno repetido.
+  assert publicados[0] == publicados[1]
+  assert len(set(publicados[0])) == len(publicados[0])
+  for lista in toots.values():
+    for toot in lista:
+      assert respuestas.pop((toot["id"], toot["cuenta"])) == 1
+  assert not respuestas
+  with sqlite3.connect(carpeta / "catalogo.db") as con:
+    usados = con.execute("SELECT count(*) FROM libros WHERE usado = 1").fetchone()[0]
+    enCola = con.execute("SELECT count(*) FROM cola").fetchone()[0]
+  assert usados - enCola == len(publicados[0])
+  assert Bitacora(str(carpeta / "bitacora.jsonl")).cargar() == []
+
+
+@pytest.mark.parametrize("punto", PUNTOS)
+def test_caida_en_cada_paso(carpeta, servidores, punto):
+  caida = lanzar(carpeta, servidores, punto)
+  assert caida.returncode == 9, caida.stderr.decode()
+  final = lanzar(carpeta, servidores)
+  assert final.returncode == 0, final.stderr.decode()
+  comprobar(carpeta, servidores[1])
+
+
+def test_respuesta_fallida_se_reintenta(carpeta, servidores):
+  mastodon = servidores[1]
+  mastodon.fallarRespuestas = True
+
+  def arreglar():
+    # Se deja fallar un par de intentos antes de que vuelva a funcionar.
+    while sum(1 for ruta, cuerpo in mastodon.peticiones if "in_reply_to_id" in (cuerpo or {})) < 4:
+      time.sleep(0.05)
+    mastodon.fallarRespuestas = False
+
+  hilo = threading.Thread(target=arreglar, daemon=True)
+  hilo.start()
+  final = lanzar(carpeta, servidores, reintento_respuesta="0.1")
+  assert final.returncode == 0, final.stderr.decode()
+  comprobar(carpeta, mastodon)
@@ -0,0 +1,54 @@
+import time
+import pytest
+from resumenes import CacheResumenes
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+  # time.time() lo avanza la prueba a mano.
+  class Reloj:
+    ahora = 1000.0
+
+  monkeypatch.setattr(time, "time", lambda: Reloj.ahora)
+  return Reloj
+
+
+def test_expulsa_las_menos_usadas_al_pasar_de_max_entradas(tmp_path, reloj):
+  cache = CacheResumenes(str(tmp_path / "resumenes.db"), max_entradas=3)
+  for clave in "abc":
+    reloj.ahora += 1
+    cache.put(clave, f"Libro {clave}", f"Resumen {clave}")
+  reloj.ahora += 1
+  assert cache.get("a") == "Resumen a"
+  reloj.ahora += 1
+  cache.put("d", "Libro d", "Resumen d")
+  # "b" es la que lleva mas tiempo sin usarse; "a" se acaba de leer.
+  assert [cache.get(clave) for clave in "abcd"] == ["Resumen a", None, "Resumen c", "Resumen d"]
+
+
+def test_caducan_las_entradas_con_mas_de_max_edad(tmp_path, reloj):
+  cache = CacheResumenes(str(tmp_path / "resumenes.db"), max_edad=100)
+  cache.put("a", "Libro a", "Resumen a")
+  reloj.ahora += 60
+  cache.put("b", "Libro b", "Resumen b")
+  # Usarla no la renueva: cuenta desde que se creo.
+  assert cache.get("a") == "Resumen a"
+  reloj.ahora += 60
+  assert cache.get("a") is None
+  assert cache.get("b") == "Resumen b"
+  reloj.ahora += 60
+  cache.put("c", "Libro c", "Resumen c")
+  assert cache.get("b") is None
+
+
+def test_las_entradas_fijas_no_se_expulsan(tmp_path, reloj):
+  cache = CacheResumenes(str(tmp_path / "resumenes.db"), max_entradas=1, max_edad=100)
+  cache.fijar([("f1", "Libro f1", "Resumen f1"), ("f2", "Libro f2", "Resumen f2")])
+  cache.put("a", "Libro a", "Resumen a")
+  reloj.ahora += 1
+  cache.put("b", "Libro b", "Resumen b")
+  assert cache.get("a") is None
+  reloj.ahora += 1000
+  cache.put("c", "Libro c", "Resumen c")
+  assert [cache.get(clave) for clave in ("f1", "f2", "b", "c")] == \
+    ["Resumen f1", "Resumen f2", None, "Resumen c"]
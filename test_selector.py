@@ -0,0 +1,37 @@
+import random
+from selector import Selector, volumen
+
+
+def test_volumenes():
+  assert volumen("La torre oscura III - Las tierras baldías") == ("la torre oscura", 3)
+  assert volumen("El Señor de los Anillos - Las Dos Torres II") == (
+    "el senor de los anillos las dos torres", 2)
+  assert volumen("Dune 2") == ("dune", 2)
+  assert volumen("Venus Prime II – Torbellino") == ("venus prime", 2)
+  for titulo in ("Lo que vi", "Catch 22", "Cien años de soledad", "YO VI", "Fahrenheit 451"):
+    assert volumen(titulo) is None
+
+
+def test_series_en_orden_y_sin_repetir_autor():
+  selector = Selector(ventana=1, azar=random.Random(1))
+  libros = ["La torre oscura III - Stephen King", "La torre oscura I - Stephen King",
+            "La torre oscura II - Stephen King", "Ficciones - Borges", "El Aleph - Borges",
+            "El informe de Brodie - Borges"]
+  for id, libro in enumerate(libros):
+    selector.agregar(id, libro, libro.rsplit(" - ", 1)[1])
+  elegidos = [libros[selector.elegir()] for _ in libros]
+  assert [l for l in elegidos if "torre" in l] == sorted(l for l in libros if "torre" in l)
+  autores = [l.rsplit(" - ", 1)[1] for l in elegidos]
+  assert all(a != b for a, b in zip(autores, autores[1:]))
+
+
+def test_serie_configurada_con_varios_autores():
+  selector = Selector(ventana=0, series=[["Cita con Rama", "Rama II", "El jardín de Rama"]],
+                      azar=random.Random(1))
+  libros = [("El jardín de Rama", "Arthur C. Clarke y Gentry Lee"),
+            ("Rama II", "Arthur C. Clarke y Gentry Lee"),
+            ("Cita con Rama", "Arthur C. Clarke"), ("Ficciones", "Borges")]
+  for id, (titulo, autor) in enumerate(libros):
+    selector.agregar(id, f"{titulo} - {autor}", autor)
+  elegidos = [libros[selector.elegir()][0] for _ in libros]
+  assert [t for t in elegidos if "Rama" in t] == ["Cita con Rama", "Rama II", "El jardín de Rama"]